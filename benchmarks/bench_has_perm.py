@@ -0,0 +1,80 @@
+"""
+Microbenchmark for the dispatch overhead of PermissionModelBackend.has_perm.
+
+Compares the per-call cost of the programmatic object check path against the
+previous dispatch, which inspected the permission with `dir()` on every call.
+No database access is involved.
+
+Run from the repository root:
+
+    python benchmarks/bench_has_perm.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'test_project'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from guardian.core import ObjectPermissionChecker
+
+from serious_django_permissions.permissions import Permission,\
+    PermissionModelBackend
+from test_app.models import RestrictedModel
+
+
+class BenchmarkObjectPermission(Permission):
+    __module__ = 'test_app.permissions'
+    model = RestrictedModel
+    description = 'Used by the has_perm microbenchmark'
+
+    @classmethod
+    def has_object_permission(cls, user, obj):
+        return obj.owner_id == user.pk
+
+
+class LegacyPermissionModelBackend(ModelBackend):
+    """
+    PermissionModelBackend as it was before it used the attributes
+    precomputed by PermissionMetaclass.
+    """
+    def has_perm(self, user_obj, perm, obj=None):
+        if type(perm) == type(Permission) and issubclass(perm, Permission):
+            perm_str = perm.__perm_str__
+        else:
+            perm_str = perm
+
+        if obj is not None:  # use django-guardian check if obj is passed
+            if "has_object_permission" in dir(perm): # do programmatic checks…
+                return perm.has_object_permission(user_obj, obj)
+            check = ObjectPermissionChecker(user_obj)
+            return check.has_perm(perm_str, obj)
+
+        return super().has_perm(user_obj, perm_str, obj)
+
+
+def main(number=200000, repeat=5):
+    user = get_user_model()(pk=1, username='bench')
+    obj = RestrictedModel(pk=1, owner_id=1)
+
+    for label, backend in (
+        ('before', LegacyPermissionModelBackend()),
+        ('after', PermissionModelBackend()),
+    ):
+        timings = timeit.repeat(
+            lambda: backend.has_perm(user, BenchmarkObjectPermission, obj),
+            number=number,
+            repeat=repeat,
+        )
+        print('{:>6}: {:8.1f} ns per has_perm call'.format(
+            label, min(timings) / number * 1e9
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Import-time benchmark for PermissionMetaclass.
+
+Generates a permissions module with 1,000 Permission classes inside the test
+app and measures how long executing it takes, with the memoized app label
+resolution and with the previous per-class lookup of the app's AppConfig.
+
+Run from the repository root:
+
+    python benchmarks/bench_import.py
+"""
+import importlib
+import inspect
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'test_project'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+
+import django
+django.setup()
+
+from django.apps import AppConfig
+
+from serious_django_permissions import permissions
+
+
+MODULE_NAME = 'test_app.bench_generated_permissions'
+
+
+def generate_source(count):
+    lines = ['from serious_django_permissions.permissions import Permission', '']
+    for i in range(count):
+        lines += [
+            '',
+            'class Generated{}Permission(Permission):'.format(i),
+            "    model = 'RestrictedModel'",
+            "    description = 'Generated permission #{}'".format(i),
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_resolve_app_label(module):
+    app = module.split('.')[0]
+    lib = importlib.import_module("{}.apps".format(app))
+    app_config = next(
+        obj for name, obj in inspect.getmembers(lib)
+        if type(obj) == type(AppConfig) and issubclass(obj, AppConfig) \
+        and obj != AppConfig
+    )
+    return app_config.name
+
+
+def import_module(code):
+    permissions._app_labels.clear()
+    module = types.ModuleType(MODULE_NAME)
+    start = time.perf_counter()
+    exec(code, module.__dict__)
+    return time.perf_counter() - start
+
+
+def main(count=1000, repeat=5):
+    code = compile(generate_source(count), MODULE_NAME.replace('.', '/') + '.py', 'exec')
+    resolve_app_label = permissions._resolve_app_label
+
+    for label, resolver in (
+        ('before', legacy_resolve_app_label),
+        ('after', resolve_app_label),
+    ):
+        permissions._resolve_app_label = resolver
+        try:
+            best = min(import_module(code) for _ in range(repeat))
+        finally:
+            permissions._resolve_app_label = resolve_app_label
+        print('{:>6}: {:8.1f} ms to import {} permission classes ({:.1f} us per class)'.format(
+            label, best * 1e3, count, best / count * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
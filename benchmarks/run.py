@@ -0,0 +1,451 @@
+"""
+Reproducible benchmark suite for syncing and checking permissions.
+
+Generates a synthetic project inside the test app, with N Permission classes
+(every tenth of them global), M groups of G permissions each, U users in a few
+groups each and O django-guardian object permissions on RestrictedModel
+instances, in a fresh test database. It then measures:
+
+- `create_permissions` and `create_groups`: the initial sync, the skipped
+  sync of unchanged declarations and a forced sync without changes
+- `user.has_perm` model-level checks: cold, i.e. the first check on a fresh
+  user instance, and warm, once the user's permissions are loaded
+- object-level checks over lists of objects: one `has_perm` per object, the
+  same after `prefetch_object_permissions`, and `allowed_objects`
+
+Each measurement reports its duration and the number of queries it made. The
+results are written as JSON, along with the parameters, versions and git
+commit, so that runs on different commits can be compared:
+
+    python benchmarks/run.py --output before.json
+    git checkout other-branch
+    python benchmarks/run.py --output after.json --compare before.json
+
+The test database is in-memory for SQLite (the default). With
+`--database postgres`, the test database is created next to the one named by
+the PGDATABASE environment variable (default: serious_permissions_bench),
+using PGHOST, PGPORT, PGUSER and PGPASSWORD to connect. The project's
+db.sqlite3 is never touched.
+
+Run from the repository root:
+
+    python benchmarks/run.py --permissions 1000 --users 5000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'test_project'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+
+import django
+from django.conf import settings
+
+
+PERMISSIONS_MODULE = 'test_app.bench_run_permissions'
+GROUPS_MODULE = 'test_app.bench_run_groups'
+
+# metrics compared by --compare; durations as relative, query counts as
+# absolute changes
+DURATION_KEYS = ('seconds', 'us_per_check')
+QUERY_KEYS = ('queries', 'queries_per_check')
+
+
+def setup_django(database, backend):
+    if database == 'postgres':
+        settings.DATABASES = {
+            'default': {
+                'ENGINE': 'django.db.backends.postgresql',
+                'NAME': os.environ.get('PGDATABASE', 'serious_permissions_bench'),
+                'HOST': os.environ.get('PGHOST', 'localhost'),
+                'PORT': os.environ.get('PGPORT', ''),
+                'USER': os.environ.get('PGUSER', ''),
+                'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            }
+        }
+    # guardian's ObjectPermissionBackend would repeat every denied object check
+    settings.AUTHENTICATION_BACKENDS = [backend]
+    settings.DEFAULT_GROUPS_MODULE = GROUPS_MODULE
+    django.setup()
+
+
+def git_revision():
+    root = os.path.join(os.path.dirname(__file__), '..')
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=root, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = bool(subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=root, stderr=subprocess.DEVNULL
+        ).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def generate_project(options):
+    """
+    Declares the synthetic Permission and Group classes in modules of the test
+    app and returns the lists of permission and group classes.
+    """
+    lines = ['from serious_django_permissions.permissions import Permission', '']
+    for i in range(options.permissions):
+        lines += [
+            '',
+            'class Bench{}Permission(Permission):'.format(i),
+            '    model = {}'.format('None' if i % 10 == 9 else "'RestrictedModel'"),
+            "    description = 'Benchmark permission #{}'".format(i),
+        ]
+    permissions_module = types.ModuleType(PERMISSIONS_MODULE)
+    exec('\n'.join(lines) + '\n', permissions_module.__dict__)
+    sys.modules[PERMISSIONS_MODULE] = permissions_module
+    permissions = [
+        getattr(permissions_module, 'Bench{}Permission'.format(i))
+        for i in range(options.permissions)
+    ]
+
+    rng = random.Random(options.seed)
+    lines = [
+        'from serious_django_permissions.groups import Group',
+        'from {} import *'.format(PERMISSIONS_MODULE),
+        '',
+    ]
+    for i in range(options.groups):
+        members = rng.sample(
+            permissions, min(options.permissions_per_group, len(permissions))
+        )
+        lines += [
+            '',
+            'class Bench{}Group(Group):'.format(i),
+            '    permissions = [{}]'.format(', '.join(perm.__name__ for perm in members)),
+        ]
+    groups_module = types.ModuleType(GROUPS_MODULE)
+    exec('\n'.join(lines) + '\n', groups_module.__dict__)
+    sys.modules[GROUPS_MODULE] = groups_module
+    groups = [
+        getattr(groups_module, 'Bench{}Group'.format(i))
+        for i in range(options.groups)
+    ]
+    return permissions, groups
+
+
+def populate(options, permissions, groups):
+    """
+    Creates the users, their group memberships, the RestrictedModel objects
+    and the guardian object permissions, and returns the users and objects.
+    """
+    from django.contrib.auth import get_user_model
+    from guardian.models import UserObjectPermission
+    from test_app.models import RestrictedModel
+
+    User = get_user_model()
+    rng = random.Random(options.seed)
+
+    User.objects.bulk_create(
+        User(username='bench{}'.format(i)) for i in range(options.users)
+    )
+    users = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+    group_ids = [group.get().pk for group in groups]
+    Membership = User.groups.through
+    Membership.objects.bulk_create(
+        Membership(user_id=user.pk, group_id=group_id)
+        for user in users
+        for group_id in rng.sample(group_ids, min(options.groups_per_user, len(group_ids)))
+    )
+
+    RestrictedModel.objects.bulk_create(
+        RestrictedModel(owner=rng.choice(users)) for _ in range(options.objects)
+    )
+    objects = list(RestrictedModel.objects.order_by('pk'))
+
+    model_permissions = [perm.get() for perm in permissions if perm.model is not None]
+    if model_permissions and objects:
+        UserObjectPermission.objects.bulk_create(
+            (
+                UserObjectPermission(
+                    user=rng.choice(users),
+                    permission=permission,
+                    content_type_id=permission.content_type_id,
+                    object_pk=str(rng.choice(objects).pk),
+                )
+                for permission in (
+                    rng.choice(model_permissions) for _ in range(options.grants)
+                )
+            ),
+            ignore_conflicts=True,
+        )
+    return users, objects
+
+
+class QueryCounter:
+    """
+    Counts the queries made on the default connection while used as a
+    context manager.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        from django.db import connection
+
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+def measure(func):
+    """
+    Calls `func` once and returns its duration and number of queries.
+    """
+    with QueryCounter() as queries:
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+    return {'seconds': duration, 'queries': queries.count}
+
+
+def measure_checks(checks):
+    """
+    Calls each of the given callables once and returns the mean duration and
+    number of queries per call.
+    """
+    with QueryCounter() as queries:
+        start = time.perf_counter()
+        for check in checks:
+            check()
+        duration = time.perf_counter() - start
+    return {
+        'checks': len(checks),
+        'us_per_check': duration / len(checks) * 1e6 if checks else 0.0,
+        'queries_per_check': queries.count / len(checks) if checks else 0.0,
+    }
+
+
+def bench_sync():
+    from serious_django_permissions import helpers
+    from serious_django_permissions.groups import Group
+    from serious_django_permissions.permissions import Permission
+
+    def create_permissions(**options):
+        return lambda: helpers.create_permissions(**options)
+
+    def create_groups(**options):
+        return lambda: helpers.create_groups(**options)
+
+    results = {}
+    for name, func in (
+        ('create_permissions.initial', create_permissions()),
+        ('create_permissions.unchanged', create_permissions()),
+        ('create_permissions.forced', create_permissions(force=True)),
+        ('create_groups.initial', create_groups()),
+        ('create_groups.unchanged', create_groups()),
+        ('create_groups.forced', create_groups(force=True)),
+    ):
+        Permission.clear_cache()
+        Group.clear_cache()
+        results[name] = measure(func)
+    return results
+
+
+def fresh_users(users):
+    from django.contrib.auth import get_user_model
+
+    return list(get_user_model().objects.filter(
+        pk__in=[user.pk for user in users]
+    ).order_by('pk'))
+
+
+def bench_has_perm(options, users, permissions):
+    rng = random.Random(options.seed)
+    sample = rng.sample(users, min(options.checks, len(users)))
+    perms = [rng.choice(permissions) for _ in sample]
+
+    users = fresh_users(sample)
+    results = {
+        'has_perm.cold': measure_checks([
+            lambda user=user, perm=perm: user.has_perm(perm)
+            for user, perm in zip(users, perms)
+        ]),
+    }
+    checks = [
+        lambda user=user, perm=rng.choice(permissions): user.has_perm(perm)
+        for user in users
+        for _ in range(options.repeat)
+    ]
+    results['has_perm.warm'] = min(
+        (measure_checks(checks) for _ in range(options.repeat)),
+        key=lambda result: result['us_per_check']
+    )
+    return results
+
+
+def bench_object_checks(options, users, objects, permissions):
+    from guardian.models import UserObjectPermission
+    from serious_django_permissions.permissions import prefetch_object_permissions
+
+    rng = random.Random(options.seed)
+    model_permissions = [perm for perm in permissions if perm.model is not None]
+    # the users with the most object permissions, so the checks find some
+    granted = UserObjectPermission.objects.values_list('user_id', flat=True)
+    counts = {}
+    for user_id in granted:
+        counts[user_id] = counts.get(user_id, 0) + 1
+    by_pk = {user.pk: user for user in users}
+    sample = sorted(counts, key=counts.get, reverse=True)[:options.list_users]
+    sample = [by_pk[pk] for pk in sample if pk in by_pk]
+    if not (sample and objects and model_permissions):
+        return {}
+    lists = [
+        (rng.choice(model_permissions),
+         rng.sample(objects, min(options.list_size, len(objects))))
+        for _ in sample
+    ]
+
+    def per_object(prefetch):
+        def run(users):
+            for user, (perm, objs) in zip(users, lists):
+                if prefetch:
+                    prefetch_object_permissions(user, objs)
+                for obj in objs:
+                    user.has_perm(perm, obj)
+        return run
+
+    def allowed_objects(users):
+        for user, (perm, objs) in zip(users, lists):
+            perm.allowed_objects(user, objs)
+
+    results = {}
+    for name, func in (
+        ('object_checks.per_object', per_object(prefetch=False)),
+        ('object_checks.prefetched', per_object(prefetch=True)),
+        ('object_checks.allowed_objects', allowed_objects),
+    ):
+        users = fresh_users(sample)
+        result = measure(lambda: func(users))
+        result['lists'] = len(lists)
+        result['objects_per_list'] = len(lists[0][1])
+        results[name] = result
+    return results
+
+
+def run(options):
+    from django.db import connection
+    from django.test.utils import get_runner
+
+    permissions, groups = generate_project(options)
+
+    runner = get_runner(settings)(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    try:
+        results = bench_sync()
+        users, objects = populate(options, permissions, groups)
+        results.update(bench_has_perm(options, users, permissions))
+        results.update(bench_object_checks(options, users, objects, permissions))
+        vendor = connection.vendor
+    finally:
+        runner.teardown_databases(old_config)
+
+    commit, dirty = git_revision()
+    return {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'backend': options.backend,
+            'parameters': {
+                key: getattr(options, key) for key in (
+                    'permissions', 'groups', 'permissions_per_group', 'users',
+                    'groups_per_user', 'objects', 'grants', 'checks',
+                    'list_users', 'list_size', 'repeat', 'seed',
+                )
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, report):
+    """
+    Returns lines comparing the results of `report` with those of `baseline`.
+    """
+    lines = []
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name, {})
+        for key, value in result.items():
+            if key not in before or key not in DURATION_KEYS + QUERY_KEYS:
+                continue
+            if key in DURATION_KEYS:
+                change = '{:+.1f}%'.format(
+                    (value / before[key] - 1) * 100 if before[key] else 0.0
+                )
+            else:
+                change = '{:+g}'.format(value - before[key])
+            lines.append('{:<32} {:<18} {:>12.4g} -> {:<12.4g} {}'.format(
+                name, key, before[key], value, change
+            ))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', choices=('sqlite', 'postgres'), default='sqlite')
+    parser.add_argument('--backend',
+                        default='serious_django_permissions.permissions.PermissionModelBackend',
+                        help='The only authentication backend to use.')
+    parser.add_argument('--permissions', type=int, default=500)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--permissions-per-group', type=int, default=20)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--groups-per-user', type=int, default=3)
+    parser.add_argument('--objects', type=int, default=1000)
+    parser.add_argument('--grants', type=int, default=10000,
+                        help='Number of guardian object permissions.')
+    parser.add_argument('--checks', type=int, default=500,
+                        help='Number of users checked by the has_perm benchmarks.')
+    parser.add_argument('--list-users', type=int, default=20,
+                        help='Number of users checked by the object check benchmarks.')
+    parser.add_argument('--list-size', type=int, default=100,
+                        help='Number of objects per list in the object check benchmarks.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Print a comparison with a previous JSON report.')
+    options = parser.parse_args(argv)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    setup_django(options.database, options.backend)
+    report = run(options)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if baseline is not None:
+        for line in compare(baseline, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
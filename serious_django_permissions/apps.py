@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+
+
+class SeriousDjangoPermissionsConfig(AppConfig):
+    name = 'serious_django_permissions'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        from . import signals
+        from .checks import check_permissions
+        from .permissions import Permission
+
+        signals.connect_signals()
+        checks.register(check_permissions)
+
+        if getattr(settings, 'SERIOUS_PERMISSIONS_LAZY', False):
+            Permission.registry.resolve_deferred()
@@ -0,0 +1,134 @@
+import hashlib
+
+from .groups import GroupMetaclass
+from .helpers import find_permissions
+from .permissions import Permission
+
+
+_index = None
+_version = None
+_generation = None
+
+
+def permission_index():
+    """
+    Returns a dict mapping the permission string of every declared Permission
+    class to its bit index.
+
+    Bits are assigned in the sorted order of the permission strings, so the
+    index is the same in every process running the same code.
+    """
+    global _index, _version, _generation
+    if _index is None or _generation != Permission.registry.generation:
+        perm_strs = sorted({perm.__perm_str__ for perm in find_permissions()})
+        _generation = Permission.registry.generation
+        _version = hashlib.sha1('\n'.join(perm_strs).encode()).hexdigest()[:12]
+        _index = {perm_str: bit for bit, perm_str in enumerate(perm_strs)}
+    return _index
+
+
+def index_version():
+    """
+    Returns a short hash identifying the current bit assignment. Store it along
+    with encoded bitmasks to detect masks built for a different set of
+    permissions.
+    """
+    permission_index()
+    return _version
+
+
+def _perm_str(perm):
+    return getattr(perm, '__perm_str__', perm)
+
+
+class PermissionBitmask(int):
+    """
+    A set of permissions, represented as an integer with one bit per declared
+    Permission class (see `permission_index`).
+
+    Permissions that are not declared as Permission classes, like Django's
+    default model permissions, cannot be represented and are never contained.
+    """
+    @classmethod
+    def from_perms(cls, perms):
+        """
+        Returns the bitmask of the given Permission classes or permission
+        strings. Permissions without a bit are ignored.
+        """
+        index = permission_index()
+        mask = 0
+        for perm in perms:
+            bit = index.get(_perm_str(perm))
+            if bit is not None:
+                mask |= 1 << bit
+        return cls(mask)
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns the bitmask of all permissions the given user has on the model
+        or global level, from their user permissions and groups.
+        """
+        return cls.from_perms(user.get_all_permissions())
+
+    @classmethod
+    def for_group(cls, group):
+        """
+        Returns the bitmask of the permissions of the given DjangoGroup instance
+        or Group class.
+        """
+        if isinstance(group, GroupMetaclass):
+            group = group.get()
+        return cls.from_perms(
+            '{}.{}'.format(app_label, codename) for app_label, codename in
+            group.permissions.values_list('content_type__app_label', 'codename')
+        )
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Returns the bitmask encoded as bytes by `encode()`.
+        """
+        return cls(int.from_bytes(data, 'big'))
+
+    def encode(self):
+        """
+        Returns this bitmask as compact bytes, e.g. to store it in a session or
+        token claim.
+        """
+        return self.to_bytes((self.bit_length() + 7) // 8, 'big')
+
+    def has(self, perm):
+        bit = permission_index().get(_perm_str(perm))
+        return bit is not None and bool(self >> bit & 1)
+
+    def has_all(self, *perms):
+        """
+        Returns whether all of the given permissions are contained.
+        """
+        index = permission_index()
+        if not all(_perm_str(perm) in index for perm in perms):
+            return False
+        mask = PermissionBitmask.from_perms(perms)
+        return int(self) & mask == mask
+
+    def has_any(self, *perms):
+        """
+        Returns whether any of the given permissions is contained.
+        """
+        return bool(int(self) & PermissionBitmask.from_perms(perms))
+
+    def perm_strs(self):
+        """
+        Returns the permission strings of all contained permissions.
+        """
+        return {
+            perm_str for perm_str, bit in permission_index().items()
+            if self >> bit & 1
+        }
+
+    def __or__(self, other):
+        return PermissionBitmask(int(self) | other)
+
+    def __and__(self, other):
+        return PermissionBitmask(int(self) & other)
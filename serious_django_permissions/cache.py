@@ -0,0 +1,55 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+KEY_PREFIX = 'serious_django_permissions'
+GLOBAL_VERSION_KEY = '{}:version'.format(KEY_PREFIX)
+
+
+def get_cache():
+    """
+    Returns the cache used for per-user permission sets, as configured by the
+    SERIOUS_PERMISSIONS_CACHE_ALIAS setting (default: 'default').
+    """
+    return caches[getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_ALIAS', 'default')]
+
+
+def _user_version_key(user_pk):
+    return '{}:version:{}'.format(KEY_PREFIX, user_pk)
+
+
+def user_permissions_key(user_pk):
+    """
+    Returns the cache key under which the permission set of the given user is
+    stored.
+
+    The key contains a global version stamp and one for the user, so bumping
+    either (see `bump_version`) makes the cached set unreachable. Versions are
+    random tokens rather than counters, so an evicted version key can never
+    make an outdated entry reachable again.
+    """
+    cache = get_cache()
+    version_keys = (GLOBAL_VERSION_KEY, _user_version_key(user_pk))
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return '{}:perms:{}:{}:{}'.format(
+        KEY_PREFIX, user_pk, *(versions[key] for key in version_keys)
+    )
+
+
+def bump_version(user_pks=None):
+    """
+    Invalidates the cached permission sets of the users with the given
+    primary keys, or of all users if `user_pks` is None.
+    """
+    if user_pks is None:
+        keys = [GLOBAL_VERSION_KEY]
+    else:
+        keys = [_user_version_key(pk) for pk in user_pks]
+    if keys:
+        get_cache().set_many({key: uuid4().hex for key in keys}, None)
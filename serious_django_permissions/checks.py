@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core import checks
+from django.utils.module_loading import autodiscover_modules
+
+
+def check_permissions(app_configs, **kwargs):
+    """
+    Reports the Permission classes that failed validation in lazy mode (see
+    the SERIOUS_PERMISSIONS_LAZY setting), where invalid classes don't raise
+    at import time.
+    """
+    from .permissions import Permission
+
+    if not getattr(settings, 'SERIOUS_PERMISSIONS_LAZY', False):
+        return []
+
+    autodiscover_modules('permissions')
+    Permission.registry.resolve_deferred()
+    return [
+        checks.Error(
+            str(error),
+            obj='{}.{}'.format(perm.__module__, perm.__qualname__),
+            id='serious_django_permissions.E001',
+        )
+        for perm, error in Permission.registry.errors
+    ]
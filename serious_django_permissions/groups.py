@@ -1,10 +1,39 @@
 from abc import ABC, ABCMeta
 
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth.models import Group as DjangoGroup
 
 from .permissions import Permission
 from .helpers import camel_to_snake
+from .registry import GroupRegistry
+
+
+# DB instances memoized by Group.get(), keyed by Group class
+_instance_cache = {}
+
+
+def _is_list_of(value, base):
+    return isinstance(value, (list, tuple)) and all(
+        isinstance(x, type) and issubclass(x, base) and x is not base
+        for x in value
+    )
+
+
+def _resolve_permissions(group):
+    """
+    Returns the permissions of the given Group class followed by those of the
+    groups it inherits from or includes, without duplicates.
+    """
+    parents = [
+        base for base in group.__bases__
+        if isinstance(base, GroupMetaclass) and base is not Group
+    ] + list(group.__dict__.get('includes', ()))
+    permissions = dict.fromkeys(group.__dict__.get('permissions', ()))
+    for parent in parents:
+        # already flattened when the parent class was created
+        permissions.update(dict.fromkeys(parent.all_permissions))
+    return list(permissions)
 
 
 class GroupMetaclass(ABCMeta):
@@ -23,46 +52,85 @@ class GroupMetaclass(ABCMeta):
             raise ImproperlyConfigured(
                 "A Group class's name must end with 'Group'."
             )
-        if not hasattr(cls, 'permissions') or\
-           not isinstance(cls.permissions, (list, tuple)) or\
-           not all(\
-                   type(x) == type(Permission) and\
-                   issubclass(x, Permission) and\
-                   not x is Permission\
-                   for x in cls.permissions
-           ):
+        if not (hasattr(cls, 'permissions') or hasattr(cls, 'includes')) or\
+           not _is_list_of(getattr(cls, 'permissions', []), Permission):
             raise ImproperlyConfigured(
                 "A Group class must have a 'permissions' attribute, which must "
                 "be a list of Permission classes (except the Permission "
                 "base class)."
             )
+        if not _is_list_of(cls.__dict__.get('includes', []), Group):
+            raise ImproperlyConfigured(
+                "A Group class's 'includes' attribute must be a list of Group "
+                "classes (except the Group base class)."
+            )
 
-        if not hasattr(cls, 'group_name'):
+        # Groups get the permissions of the groups they inherit from or
+        # include. The flattened list is what create_groups assigns.
+        # `includes` is frozen into a tuple: a group can only include groups
+        # created before it, so the hierarchy can't contain cycles as long as
+        # nobody adds to it later.
+        if 'includes' in cls.__dict__:
+            cls.includes = tuple(cls.includes)
+        cls.all_permissions = _resolve_permissions(cls)
+
+        if 'group_name' not in cls.__dict__:
             cls.group_name = camel_to_snake(name[:-5])
 
+        cls.registry.register(cls)
         return cls
 
 
 class Group(ABC, metaclass=GroupMetaclass):
+    registry = GroupRegistry()
+
     @classmethod
     def get(cls):
         """
         Returns the DB instance representing this group.
+
+        If the SERIOUS_PERMISSIONS_CACHE_LOOKUPS setting is enabled, the
+        instance is memoized until it is saved or deleted, or `clear_cache()`
+        is called.
         """
-        return DjangoGroup.objects.get(
+        if not getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            return cls._get()
+        try:
+            return _instance_cache[cls]
+        except KeyError:
+            instance = _instance_cache[cls] = cls._get()
+            return instance
+
+    @classmethod
+    async def aget(cls):
+        """
+        Async version of `get()`.
+        """
+        if getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            try:
+                return _instance_cache[cls]
+            except KeyError:
+                pass
+        instance = await DjangoGroup.objects.aget(
             name=cls.group_name,
         )
+        if getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            _instance_cache[cls] = instance
+        return instance
 
     @classmethod
-    def _update_or_create(cls):
+    def clear_cache(cls):
         """
-        !!! This method is private and is intended to only be called from the
-        create_permissions management command. Do not call it from your code.
-
-        Creates and returns this group, or updates and returns it based on a
-        matching instance.
+        Clears the memoized DB instance of this group, or of all groups if
+        called on the Group base class.
         """
+        if cls is Group:
+            _instance_cache.clear()
+        else:
+            _instance_cache.pop(cls, None)
 
-        return DjangoGroup.objects.update_or_create(
+    @classmethod
+    def _get(cls):
+        return DjangoGroup.objects.get(
             name=cls.group_name,
         )
@@ -1,10 +1,10 @@
 import re
-from abc import ABC
 import importlib
-import inspect
+import json
 
-from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.module_loading import autodiscover_modules
 
 
 # https://stackoverflow.com/a/1176023/3090225
@@ -15,22 +15,48 @@ def camel_to_snake(name):
     return all_cap_re.sub(r'\1_\2', s1).lower()
 
 
-def create_permissions(*args, **options):
+def find_permissions():
+    """
+    Returns all declared Permission classes, after importing the `permissions`
+    module of every installed app.
+    """
     from .permissions import Permission
 
-    for app in settings.INSTALLED_APPS:
-            lib = importlib.util.find_spec("{}.permissions".format(app))
-            if lib:
-                lib = importlib.import_module("{}.permissions".format(app))
-                for name, obj in inspect.getmembers(lib):
-                    if type(obj) == type(Permission) and issubclass(obj, Permission)\
-                       and obj.__base__ != ABC:
-                        perm, created_at = obj._update_or_create()
+    autodiscover_modules('permissions')
+    return list(Permission.registry)
 
-def create_groups(*args, **options):
-    from .groups import Group
+def create_permissions(*args, **options):
+    """
+    Syncs all declared permissions to the DB and returns the applied SyncPlan.
+    The sync is skipped and None returned if the declarations haven't changed
+    since the last sync, unless `force=True` is passed. With `dry_run=True`,
+    the plan is computed but not applied. With `prune=True`, permissions that
+    are no longer declared are deleted (see `sync.plan_permissions`).
+    """
+    from .models import SyncFingerprint
+    from .sync import apply_plan, plan_permissions, permissions_fingerprint
 
-    create_permissions()
+    using = options.get('using', DEFAULT_DB_ALIAS)
+    dry_run = options.get('dry_run')
+    prune = options.get('prune')
+    permissions = find_permissions()
+    fingerprint = permissions_fingerprint(permissions)
+    if not (options.get('force') or dry_run or prune) and \
+       SyncFingerprint.matches('permissions', fingerprint, using=using):
+        return None
+
+    plan = plan_permissions(permissions, using=using, prune=prune)
+    if not dry_run:
+        apply_plan(plan)
+        SyncFingerprint.store('permissions', fingerprint, using=using)
+    return plan
+
+def find_groups():
+    """
+    Returns all Group classes declared in the module referenced by the
+    DEFAULT_GROUPS_MODULE setting.
+    """
+    from .groups import Group
 
     if not getattr(settings, 'DEFAULT_GROUPS_MODULE', None):
         raise AttributeError("DEFAULT_GROUPS_MODULE setting is not set!")
@@ -39,14 +65,73 @@ def create_groups(*args, **options):
         groups_module = settings.DEFAULT_GROUPS_MODULE
 
     lib = importlib.import_module(groups_module)
-    for name, obj in inspect.getmembers(lib):
-        if type(obj) == type(Group) and issubclass(obj, Group)\
-           and obj.__base__ != ABC:
-            group, created_at = obj._update_or_create()
-            perm_db_objs = [
-                perm.get() for perm in obj.permissions
-            ]
-            group.permissions.set(perm_db_objs)
-
-def setup_permissions():
-    create_groups()
+    groups = dict.fromkeys(Group.registry.by_module(groups_module))
+    # groups declared elsewhere and imported into the groups module
+    groups.update(dict.fromkeys(
+        obj for obj in vars(lib).values()
+        if isinstance(obj, type) and issubclass(obj, Group) and obj in Group.registry
+    ))
+    return list(groups)
+
+def create_groups(*args, **options):
+    """
+    Syncs all declared permissions and the groups of the
+    DEFAULT_GROUPS_MODULE to the DB and returns the applied SyncPlan. The
+    sync is skipped and None returned if the declarations haven't changed
+    since the last sync, unless `force=True` is passed. With `dry_run=True`,
+    the plan is computed but not applied. With `prune=True`, permissions that
+    are no longer declared are deleted (see `sync.plan_permissions`).
+    """
+    from .models import SyncFingerprint
+    from .sync import apply_plan, plan_groups, groups_fingerprint,\
+        permissions_fingerprint
+
+    using = options.get('using', DEFAULT_DB_ALIAS)
+    dry_run = options.get('dry_run')
+    prune = options.get('prune')
+    # the groups module may import permissions declared outside of the apps'
+    # permissions modules, so it is imported first
+    groups = find_groups()
+    permissions = find_permissions()
+    fingerprint = groups_fingerprint(permissions, groups)
+    if not (options.get('force') or dry_run or prune) and \
+       SyncFingerprint.matches('groups', fingerprint, using=using):
+        return None
+
+    plan = plan_groups(groups, permissions=permissions, using=using, prune=prune)
+    if not dry_run:
+        apply_plan(plan)
+        SyncFingerprint.store(
+            'permissions', permissions_fingerprint(permissions), using=using
+        )
+        SyncFingerprint.store('groups', fingerprint, using=using)
+    return plan
+
+def write_plan(command, plan, **options):
+    """
+    Writes the given SyncPlan to the command's stdout if `dry_run`, `diff` or
+    `json` is set, as JSON or in a diff-like format.
+    """
+    if not (options.get('dry_run') or options.get('diff') or options.get('json')):
+        return
+
+    from .sync import SyncPlan
+
+    if options.get('json'):
+        data = (plan if plan is not None else SyncPlan()).as_dict()
+        data['dry_run'] = bool(options.get('dry_run'))
+        data['skipped'] = plan is None
+        command.stdout.write(json.dumps(data, indent=2, sort_keys=True))
+    elif plan is None:
+        command.stdout.write(
+            "Skipped, the declarations haven't changed since the last sync "
+            "(use --force to sync anyway)."
+        )
+    elif not plan:
+        command.stdout.write("No changes.")
+    else:
+        for line in plan.as_text():
+            command.stdout.write(line)
+
+def setup_permissions(force=False):
+    create_groups(force=force)
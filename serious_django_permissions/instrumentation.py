@@ -0,0 +1,138 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .signals import permission_checked
+
+
+# trackers of the track_permission_checks() blocks the current context is in
+_trackers = ContextVar('serious_django_permissions_trackers', default=())
+
+# number of active track_permission_checks() blocks in all threads; the
+# receiver is only connected while there are any, so that checks aren't
+# instrumented otherwise
+_active = 0
+_lock = threading.Lock()
+
+
+class PermissionCheck:
+    """
+    A single permission check, as reported by the `permission_checked`
+    signal.
+    """
+    def __init__(self, user, perm, obj, granted, path, cache_hit, duration,
+                 queries):
+        self.user = user
+        self.perm = perm
+        self.obj = obj
+        self.granted = granted
+        self.path = path
+        self.cache_hit = cache_hit
+        self.duration = duration
+        self.queries = queries
+
+    @property
+    def label(self):
+        """
+        Returns the permission string of the checked permission, the string
+        representation of the checked expression, or the path of checks that
+        aren't about a single permission (i.e. 'prefetch').
+        """
+        if self.perm is None:
+            return self.path
+        return getattr(self.perm, '__perm_str__', str(self.perm))
+
+    def __repr__(self):
+        return '<PermissionCheck {} via {}: {} queries, {:.3f} ms>'.format(
+            self.label, self.path, self.queries, self.duration * 1e3
+        )
+
+
+class PermissionCheckTracker:
+    """
+    The permission checks made inside a `track_permission_checks()` block.
+    """
+    def __init__(self):
+        self.checks = []
+
+    @property
+    def count(self):
+        return len(self.checks)
+
+    @property
+    def duration(self):
+        return sum(check.duration for check in self.checks)
+
+    @property
+    def queries(self):
+        return sum(check.queries or 0 for check in self.checks)
+
+    def by_permission(self):
+        """
+        Returns a dict mapping the label of each checked permission to a dict
+        with the number of checks, queries and their total duration, ordered
+        by the number of queries.
+        """
+        totals = {}
+        for check in self.checks:
+            total = totals.setdefault(
+                check.label, {'count': 0, 'queries': 0, 'duration': 0.0}
+            )
+            total['count'] += 1
+            total['queries'] += check.queries or 0
+            total['duration'] += check.duration
+        return dict(sorted(
+            totals.items(), key=lambda item: item[1]['queries'], reverse=True
+        ))
+
+    def summary(self):
+        """
+        Returns a one-line summary of the tracked checks.
+        """
+        return '{} permission checks, {} queries, {:.1f} ms'.format(
+            self.count, self.queries, self.duration * 1e3
+        )
+
+
+def _record(sender, **kwargs):
+    kwargs.pop('signal', None)
+    trackers = _trackers.get()
+    if trackers:
+        check = PermissionCheck(**kwargs)
+        for tracker in trackers:
+            tracker.checks.append(check)
+
+
+@contextmanager
+def track_permission_checks():
+    """
+    Collects the permission checks made by PermissionModelBackend in the
+    current thread or async context while the block runs, and yields a
+    PermissionCheckTracker holding them.
+
+        with track_permission_checks() as tracker:
+            response = view(request)
+        logger.info(tracker.summary())
+
+    Blocks can be nested; each tracker gets all checks made inside it.
+    """
+    global _active
+
+    tracker = PermissionCheckTracker()
+    with _lock:
+        if not _active:
+            permission_checked.connect(
+                _record, dispatch_uid='serious_django_permissions.instrumentation'
+            )
+        _active += 1
+    token = _trackers.set(_trackers.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _trackers.reset(token)
+        with _lock:
+            _active -= 1
+            if not _active:
+                permission_checked.disconnect(
+                    dispatch_uid='serious_django_permissions.instrumentation'
+                )
@@ -9,10 +9,35 @@ class Command(BaseCommand):
     """
     help = 'create groups defined in a module referenced by the DEFAULT_GROUPS_MODULE setting.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Sync even if the declared permissions and groups haven't changed since the last "
+                 "sync.",
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help="Delete permissions that are no longer declared, along with "
+                 "their group, user and object permission assignments.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Print the changes a sync would make, without writing them.",
+        )
+        parser.add_argument(
+            '--diff', action='store_true',
+            help="Print the changes made by the sync.",
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help="Print the changes as JSON (implies --diff).",
+        )
+
     def handle(self, *args, **options):
         """
             This method looks at the module set in DEFAULT_GROUPS_FILE and
             searches for classes that are inheriting our Group class.
             It creates a Django Group with associated permissions for each found.
         """
-        helpers.create_groups(self, *args, **options)
+        plan = helpers.create_groups(self, *args, **options)
+        helpers.write_plan(self, plan, **options)
@@ -9,10 +9,35 @@ class Command(BaseCommand):
     """
     help = "create permissions defined anywhere in the current Django project's apps"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Sync even if the declared permissions haven't changed since the last "
+                 "sync.",
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help="Delete permissions that are no longer declared, along with "
+                 "their group, user and object permission assignments.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Print the changes a sync would make, without writing them.",
+        )
+        parser.add_argument(
+            '--diff', action='store_true',
+            help="Print the changes made by the sync.",
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help="Print the changes as JSON (implies --diff).",
+        )
+
     def handle(self, *args, **options):
         """
             This method iterates through all installed apps and searches for
             classes that are inheriting our Permission class.
             If it finds one it creates the permission in the django model
         """
-        helpers.create_permissions(self, *args, **options)
+        plan = helpers.create_permissions(self, *args, **options)
+        helpers.write_plan(self, plan, **options)
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group as DjangoGroup
+from django.contrib.auth.models import Permission as DjangoPermission
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import EffectiveUserPermission
+
+
+# maximum number of primary keys per DELETE
+BATCH_SIZE = 1000
+
+
+def is_enabled():
+    """
+    Returns whether the SERIOUS_PERMISSIONS_MATERIALIZE setting is enabled,
+    i.e. whether EffectiveUserPermission rows are kept up to date.
+    """
+    return getattr(settings, 'SERIOUS_PERMISSIONS_MATERIALIZE', False)
+
+
+def compute_effective_permissions(user_ids=None, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the set of `(user id, permission string)` pairs of the permissions
+    the given users (default: all users) have through their user permissions
+    or groups, like ModelBackend resolves them.
+    """
+    User = get_user_model()
+    user_permissions_query = User._meta.get_field('user_permissions').related_query_name()
+    user_groups_query = 'group__{}'.format(
+        User._meta.get_field('groups').related_query_name()
+    )
+
+    pairs = set()
+    for user_query in (user_permissions_query, user_groups_query):
+        queryset = DjangoPermission.objects.using(using)
+        if user_ids is None:
+            queryset = queryset.filter(**{'{}__isnull'.format(user_query): False})
+        else:
+            queryset = queryset.filter(**{'{}__in'.format(user_query): user_ids})
+        pairs.update(
+            (user_id, '{}.{}'.format(app_label, codename))
+            for user_id, app_label, codename in queryset.order_by().values_list(
+                user_query, 'content_type__app_label', 'codename'
+            )
+        )
+    return pairs
+
+
+def refresh_effective_permissions(user_ids=None, using=DEFAULT_DB_ALIAS):
+    """
+    Brings the EffectiveUserPermission rows of the given users (default: all
+    users) up to date.
+
+    The effective permissions are resolved with two queries and diffed with
+    the existing rows in memory; the differences are written with a bulk
+    insert and bulk deletes.
+
+    Returns a tuple `(added, removed)` with the numbers of added and removed
+    rows.
+    """
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0, 0
+
+    wanted = compute_effective_permissions(user_ids, using=using)
+    existing = EffectiveUserPermission.objects.using(using)
+    if user_ids is not None:
+        existing = existing.filter(user_id__in=user_ids)
+    existing = {
+        (user_id, perm): pk
+        for pk, user_id, perm in existing.values_list('pk', 'user_id', 'perm')
+    }
+
+    to_add = [pair for pair in wanted if pair not in existing]
+    to_remove = [pk for pair, pk in existing.items() if pair not in wanted]
+    with transaction.atomic(using=using):
+        if to_add:
+            EffectiveUserPermission.objects.using(using).bulk_create(
+                (EffectiveUserPermission(user_id=user_id, perm=perm)
+                 for user_id, perm in to_add),
+                ignore_conflicts=True
+            )
+        for i in range(0, len(to_remove), BATCH_SIZE):
+            EffectiveUserPermission.objects.using(using).filter(
+                pk__in=to_remove[i:i + BATCH_SIZE]
+            ).delete()
+    return len(to_add), len(to_remove)
+
+
+def users_in_groups(group_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the ids of the users in any of the given groups.
+    """
+    field = get_user_model()._meta.get_field('groups')
+    return set(
+        field.remote_field.through.objects.using(using).filter(**{
+            '{}__in'.format(field.m2m_reverse_field_name()): group_ids
+        }).values_list(field.m2m_field_name(), flat=True)
+    )
+
+
+def users_with_permission(permission, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the ids of the users whose materialized permissions contain the
+    permission string of the given Permission instance.
+    """
+    app_label = ContentType.objects.db_manager(using).get_for_id(
+        permission.content_type_id
+    ).app_label
+    return set(
+        EffectiveUserPermission.objects.using(using).filter(
+            perm='{}.{}'.format(app_label, permission.codename)
+        ).values_list('user_id', flat=True)
+    )
+
+
+def affected_users(through, instance, reverse, pk_set, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the ids of the users whose effective permissions are affected by
+    an `m2m_changed` signal of `User.user_permissions`, `User.groups` or
+    `Group.permissions`.
+    """
+    if through is DjangoGroup.permissions.through:
+        if not reverse:
+            group_ids = [instance.pk]
+        elif pk_set is not None:
+            group_ids = pk_set
+        else:
+            group_ids = through.objects.using(using).filter(
+                permission_id=instance.pk
+            ).values_list('group_id', flat=True)
+        return users_in_groups(group_ids, using=using)
+
+    if not reverse:
+        return {instance.pk}
+    if pk_set is not None:
+        return set(pk_set)
+    # cleared from the permission's or group's side
+    field = next(
+        field for field in get_user_model()._meta.many_to_many
+        if field.remote_field.through is through
+    )
+    return set(
+        through.objects.using(using).filter(**{
+            field.m2m_reverse_field_name(): instance.pk
+        }).values_list(field.m2m_field_name(), flat=True)
+    )
@@ -0,0 +1,48 @@
+import logging
+
+from .instrumentation import track_permission_checks
+
+
+logger = logging.getLogger('serious_django_permissions')
+
+
+class PermissionCostMiddleware:
+    """
+    Logs the number, total duration and queries of the permission checks made
+    while handling each request, per view, to the 'serious_django_permissions'
+    logger at INFO level, with a per-permission breakdown at DEBUG level.
+
+    Checks are only instrumented while the logger is enabled for INFO.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+
+        with track_permission_checks() as tracker:
+            response = self.get_response(request)
+        if tracker.checks:
+            self.log(request, tracker)
+        return response
+
+    def log(self, request, tracker):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else request.path
+        logger.info(
+            '%s %s: %s', request.method, view, tracker.summary(),
+            extra={
+                'view': view,
+                'permission_checks': tracker.count,
+                'permission_queries': tracker.queries,
+                'permission_duration': tracker.duration,
+            }
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for label, total in tracker.by_permission().items():
+                logger.debug(
+                    '%s %s: %s checked %d times, %d queries, %.1f ms',
+                    request.method, view, label, total['count'],
+                    total['queries'], total['duration'] * 1e3
+                )
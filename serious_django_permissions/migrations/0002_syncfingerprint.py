@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serious_django_permissions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncFingerprint',
+            fields=[
+                ('key', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('serious_django_permissions', '0003_effectiveuserpermission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncedPermission',
+            fields=[
+                ('permission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='auth.permission')),
+            ],
+        ),
+    ]
@@ -1,29 +1,130 @@
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, router
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 
 
+# the ContentType of GlobalPermission, keyed by database alias
+_content_types = {}
+
+
 class GlobalPermissionManager(models.Manager):
     def get_queryset(self):
         return super(GlobalPermissionManager, self).get_queryset().filter(
-            content_type=ContentType.objects.get_for_model(
-                GlobalPermission,
-                for_concrete_model=False
-            )
+            content_type_id=GlobalPermission.get_content_type().pk
         )
 
+    def in_bulk_by_codename(self, codenames):
+        """
+        Returns a dict mapping the given codenames to the global permissions
+        with these codenames, loaded with a single query on the
+        (content_type, codename) unique index. Missing codenames are left out.
+        """
+        return {
+            perm.codename: perm
+            for perm in self.get_queryset().filter(codename__in=list(codenames))
+        }
+
 
 class GlobalPermission(Permission):
     """A global permission, not attached to a model"""
 
     objects = GlobalPermissionManager()
 
+    @classmethod
+    def get_content_type(cls, using=DEFAULT_DB_ALIAS):
+        """
+        Returns the ContentType all global permissions are attached to,
+        memoized per database until `clear_content_type_cache()` is called.
+        """
+        try:
+            return _content_types[using]
+        except KeyError:
+            content_type = _content_types[using] = \
+                ContentType.objects.db_manager(using).get_for_model(
+                    GlobalPermission,
+                    for_concrete_model=False
+                )
+            return content_type
+
+    @classmethod
+    def get_cached_content_type(cls, using=DEFAULT_DB_ALIAS):
+        """
+        Returns the memoized ContentType of global permissions, or None if it
+        hasn't been loaded yet.
+        """
+        return _content_types.get(using)
+
+    @classmethod
+    def set_content_type(cls, content_type, using=DEFAULT_DB_ALIAS):
+        """
+        Memoizes the given ContentType as the one of global permissions, e.g.
+        when it was loaded along with others.
+        """
+        _content_types[using] = content_type
+
+    @classmethod
+    def clear_content_type_cache(cls):
+        _content_types.clear()
+
     def save(self, *args, **kwargs):
-        self.content_type = ContentType.objects.get_for_model(
-            GlobalPermission,
-            for_concrete_model=False
+        self.content_type = GlobalPermission.get_content_type(
+            kwargs.get('using') or router.db_for_write(GlobalPermission, instance=self)
         )
         return super().save(*args, **kwargs)
 
     class Meta:
         proxy = True
+
+
+class SyncFingerprint(models.Model):
+    """
+    The fingerprint of the declared permissions or groups at the time they
+    were last synced to the DB, used by the sync commands to skip syncs when
+    nothing changed.
+    """
+    key = models.CharField(max_length=32, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+
+    @classmethod
+    def matches(cls, key, fingerprint, using=DEFAULT_DB_ALIAS):
+        return cls.objects.using(using).filter(
+            key=key, fingerprint=fingerprint
+        ).exists()
+
+    @classmethod
+    def store(cls, key, fingerprint, using=DEFAULT_DB_ALIAS):
+        cls.objects.using(using).update_or_create(
+            key=key, defaults={'fingerprint': fingerprint}
+        )
+
+
+class SyncedPermission(models.Model):
+    """
+    Marks a permission as created or synced from a declared Permission
+    class, so that `--prune` only ever deletes permissions this package
+    manages.
+    """
+    permission = models.OneToOneField(
+        Permission,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+
+
+class EffectiveUserPermission(models.Model):
+    """
+    A permission string a user has through their user permissions or groups,
+    materialized for MaterializedPermissionModelBackend (see
+    `materialized.refresh_effective_permissions`).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    perm = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = [('user', 'perm')]
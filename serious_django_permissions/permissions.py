@@ -1,18 +1,83 @@
 import importlib
 import inspect
-from abc import ABC, ABCMeta
+import time
+from abc import ABC, ABCMeta, abstractmethod
+from collections.abc import Mapping
+from contextlib import ExitStack
+from contextvars import ContextVar
+from itertools import groupby
 
-from django.apps import AppConfig
+from asgiref.sync import sync_to_async
+from django.apps import AppConfig, apps
+from django.contrib import auth
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import Permission as DjangoPermission
-from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ImproperlyConfigured
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.db import DEFAULT_DB_ALIAS, connections
 
 from guardian.backends import ObjectPermissionChecker
+from guardian.shortcuts import get_objects_for_user
 
-from .models import GlobalPermission
+from . import cache
+from .models import EffectiveUserPermission, GlobalPermission
 from .helpers import camel_to_snake
+from .registry import PermissionRegistry
+from .signals import permission_checked
+
+
+# DB instances memoized by Permission.get(), keyed by Permission class
+_instance_cache = {}
+
+
+# ContentTypes memoized by Permission.get_content_type(), keyed by
+# (Permission class, database alias)
+_content_types = {}
+
+
+# app labels resolved by _resolve_app_label(), keyed by module
+_app_labels = {}
+
+
+def _resolve_app_label(module):
+    """
+    Returns the label of the app that contains the given module, memoized per
+    module.
+    """
+    try:
+        return _app_labels[module]
+    except KeyError:
+        pass
+
+    app_config = None
+    if apps.apps_ready:
+        app_config = apps.get_containing_app_config(module)
+    if app_config is None:
+        # Before the app registry is ready, use the AppConfig declared in the
+        # apps module of the top-level package.
+        app = module.split('.')[0]
+        lib = importlib.import_module("{}.apps".format(app))
+        app_config = next(
+            obj for name, obj in inspect.getmembers(lib)
+            if type(obj) == type(AppConfig) and issubclass(obj, AppConfig) \
+            and obj != AppConfig
+        )
+    # like AppConfig.__init__, for the class found before the registry is
+    # ready
+    app_label = getattr(app_config, 'label', None) or \
+        app_config.name.rpartition('.')[2]
+    _app_labels[module] = app_label
+    return app_label
+
+
+# attributes of Permission classes that are resolved on first access in lazy
+# mode
+_LAZY_ATTRIBUTES = frozenset(('app_label', 'codename', '__perm_str__'))
+
+
+def _lazy_mode():
+    return settings.configured and \
+        getattr(settings, 'SERIOUS_PERMISSIONS_LAZY', False)
 
 
 class PermissionMetaclass(ABCMeta):
@@ -32,19 +97,73 @@ class PermissionMetaclass(ABCMeta):
     def __str__(cls):
         return cls.__name__
 
+    # Combining permissions with these operators creates a
+    # PermissionExpression, e.g. `(APermission | BPermission) & ~CPermission`.
+    def __and__(cls, other):
+        return AllOf(cls, other)
+
+    def __or__(cls, other):
+        return AnyOf(cls, other)
+
+    def __invert__(cls):
+        return Not(cls)
+
     def __new__(mcls, name, *args, **kwargs):
         cls = super(PermissionMetaclass, mcls).__new__(mcls, name, *args, **kwargs)
+        # Precomputed so PermissionModelBackend.has_perm doesn't need to
+        # inspect the class on every check.
+        cls._has_bulk_object_check = callable(
+            getattr(cls, 'has_object_permissions_bulk', None)
+        )
+        if cls._has_bulk_object_check and \
+           not callable(getattr(cls, 'has_object_permission', None)):
+            cls.has_object_permission = classmethod(
+                lambda cls, user, obj: bool(cls.allowed_objects(user, [obj]))
+            )
+        cls._has_object_check = callable(
+            getattr(cls, 'has_object_permission', None)
+        )
         if cls.__base__ == ABC:
             return cls
 
-        app = cls.__module__.split('.')[0]
-        lib = importlib.import_module("{}.apps".format(app))
-        app_config = next(
-            obj for name, obj in inspect.getmembers(lib)
-            if type(obj) == type(AppConfig) and issubclass(obj, AppConfig) \
-            and obj != AppConfig
+        # Subclasses of other permission classes are always configured
+        # eagerly, as they'd otherwise expose the attributes of their parent
+        # instead of resolving their own on first access.
+        inherits_permission = any(
+            base is not Permission and isinstance(base, PermissionMetaclass)
+            for base in cls.__bases__
         )
-        cls.app_label = app_config.name
+        if _lazy_mode() and not inherits_permission:
+            # app label, codename and permission string are resolved on first
+            # access (see __getattr__), or in AppConfig.ready()
+            cls.registry.defer(cls)
+            return cls
+
+        cls._configure()
+        cls.registry.register(cls)
+        return cls
+
+    def __getattr__(cls, name):
+        # only called if regular attribute lookup failed, i.e. never once a
+        # class is configured
+        if name in _LAZY_ATTRIBUTES:
+            if cls.registry.is_deferred(cls):
+                cls.registry.resolve(cls)
+                return getattr(cls, name)
+            for perm, error in cls.registry.errors:
+                if perm is cls:
+                    raise error
+        raise AttributeError(
+            "type object '{}' has no attribute '{}'".format(cls.__name__, name)
+        )
+
+    def _configure(cls):
+        """
+        Validates this permission class and sets its app label, codename and
+        permission string.
+        """
+        name = cls.__name__
+        cls.app_label = _resolve_app_label(cls.__module__)
 
         if not hasattr(cls, 'model'):
             raise ImproperlyConfigured(
@@ -61,7 +180,8 @@ class PermissionMetaclass(ABCMeta):
                 "A Permission class must have a 'description' attribute."
             )
 
-        if not hasattr(cls, 'codename'):
+        # subclasses get their own codename unless they declare one
+        if 'codename' not in cls.__dict__:
             cls.codename = camel_to_snake(name[:-10])
 
         if cls.model is None:
@@ -70,70 +190,141 @@ class PermissionMetaclass(ABCMeta):
         else:
             cls.__perm_str__ = '{}.{}'.format(cls.app_label, cls.codename)
 
-        return cls
-
 
 class Permission(ABC, metaclass=PermissionMetaclass):
     model = None
     description = ""
+    registry = PermissionRegistry()
 
     @classmethod
-    def _update_or_create(cls):
+    def get(cls):
         """
-        !!! This method is private and is intended to only be called from the
-        create_permissions management command. Do not call it from your code.
+        Returns the DB instance representing this permission.
 
-        Creates and returns this permission, or updates and returns it based on a
-        matching instance (wrt. codename and content type).
+        If the SERIOUS_PERMISSIONS_CACHE_LOOKUPS setting is enabled, the
+        instance is memoized until it is saved or deleted, or `clear_cache()`
+        is called.
         """
-        if cls.model is not None:
-            if isinstance(cls.model, str):
-                content_type = ContentType.objects.get(
-                    app_label=cls.app_label,
-                    model=cls.model.lower()
-                )
-            elif issubclass(cls.model, models.Model):
-                content_type = ContentType.objects.get_for_model(
-                    cls.model,
-                    for_concrete_model=False
-                )
-            else:
-                raise ValueError(
-                    "{}.model is not a string or models.Model subclass!".format(cls)
-                )
+        if not _is_instrumented():
+            return cls._lookup()
+
+        cache_hit = cls in _instance_cache
+        instance, duration, queries = _measure(cls._lookup)
+        permission_checked.send(
+            sender=cls, user=None, perm=cls, obj=None, granted=None,
+            path='lookup', cache_hit=cache_hit, duration=duration,
+            queries=queries,
+        )
+        return instance
+
+    @classmethod
+    def _lookup(cls):
+        if not getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            return cls._get()
+        try:
+            return _instance_cache[cls]
+        except KeyError:
+            instance = _instance_cache[cls] = cls._get()
+            return instance
 
-            return DjangoPermission.objects.update_or_create(
+    @classmethod
+    async def aget(cls):
+        """
+        Async version of `get()`.
+        """
+        if getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            try:
+                return _instance_cache[cls]
+            except KeyError:
+                pass
+        content_type = await cls.aget_content_type()
+        if cls.model is not None:
+            instance = await DjangoPermission.objects.aget(
                 codename=cls.codename,
                 content_type=content_type,
-                defaults={'name': cls.description},
             )
         else:
-            return GlobalPermission.objects.update_or_create(
+            instance = await GlobalPermission.objects.aget(
                 codename=cls.codename,
-                name=cls.description
             )
+        if getattr(settings, 'SERIOUS_PERMISSIONS_CACHE_LOOKUPS', False):
+            _instance_cache[cls] = instance
+        return instance
 
     @classmethod
-    def get(cls):
+    def clear_cache(cls):
         """
-        Returns the DB instance representing this permission.
+        Clears the memoized DB instance of this permission, or of all
+        permissions if called on the Permission base class.
         """
-        if cls.model is not None:
-            if isinstance(cls.model, str):
-                content_type = ContentType.objects.get(
-                    app_label=cls.app_label,
-                    model=cls.model.lower()
-                )
-            elif issubclass(cls.model, models.Model):
-                content_type = ContentType.objects.get_for_model(
-                    cls.model,
-                    for_concrete_model=False
-                )
-            else:
-                raise ValueError(
-                    "{}.model is not a string or models.Model subclass!".format(cls)
-                )
+        if cls is Permission:
+            _instance_cache.clear()
+        else:
+            _instance_cache.pop(cls, None)
+
+    @classmethod
+    def get_content_type(cls, using=DEFAULT_DB_ALIAS):
+        """
+        Returns the ContentType this permission is attached to (the one of
+        GlobalPermission for global permissions), memoized per database.
+
+        The first lookup that misses the memo resolves the content types of
+        all declared permissions at once (see `warm_content_types`).
+        """
+        try:
+            return _content_types[(cls, using)]
+        except KeyError:
+            pass
+        Permission.warm_content_types(using=using)
+        try:
+            return _content_types[(cls, using)]
+        except KeyError:
+            # not registered, or its model cannot be resolved: resolve it
+            # alone to raise the error
+            from .sync import resolve_content_types
+            content_type = _content_types[(cls, using)] = \
+                resolve_content_types([cls], using=using)[cls]
+            return content_type
+
+    @classmethod
+    async def aget_content_type(cls, using=DEFAULT_DB_ALIAS):
+        """
+        Async version of `get_content_type()`.
+        """
+        try:
+            return _content_types[(cls, using)]
+        except KeyError:
+            return await sync_to_async(cls.get_content_type)(using)
+
+    @classmethod
+    def warm_content_types(cls, permissions=None, using=DEFAULT_DB_ALIAS):
+        """
+        Resolves and memoizes the content types of the given Permission
+        classes (default: all declared ones), loading those of string models
+        with a single query. Permissions whose content type cannot be resolved
+        are skipped.
+        """
+        from .sync import resolve_content_types
 
+        if permissions is None:
+            permissions = list(cls.registry)
+        content_types = resolve_content_types(permissions, using=using, strict=False)
+        for perm, content_type in content_types.items():
+            _content_types[(perm, using)] = content_type
+
+    @classmethod
+    def clear_content_type_cache(cls):
+        """
+        Clears the memoized content types of all permissions. This happens
+        automatically after `migrate` and when a ContentType is deleted.
+        """
+        _content_types.clear()
+        GlobalPermission.clear_content_type_cache()
+
+    @classmethod
+    def _get(cls):
+        if cls.model is not None:
+            content_type = cls.get_content_type()
             return DjangoPermission.objects.get(
                 codename=cls.codename,
                 content_type=content_type,
@@ -141,25 +332,635 @@ class Permission(ABC, metaclass=PermissionMetaclass):
         else:
             return GlobalPermission.objects.get(
                 codename=cls.codename,
-                name=cls.description
             )
 
     @classmethod
     def user_has_perm(cls, user):
         return user.has_perm(cls.__perm_str__)
 
+    @classmethod
+    async def auser_has_perm(cls, user, obj=None):
+        """
+        Returns whether the user has this permission (on `obj`, if given),
+        without blocking the event loop (see `ahas_perm`).
+        """
+        return await ahas_perm(user, cls, obj)
+
+    @classmethod
+    def filter_queryset(cls, user, queryset):
+        """
+        Returns the subset of `queryset` that the given user has this
+        permission for, as a queryset, i.e. the objects for which
+        `user.has_perm(cls, obj)` is true.
+
+        Inactive users get no objects and active superusers get the whole
+        queryset. A global permission is granted on every object if the user
+        has it. Otherwise the queryset is filtered in SQL to the objects the
+        user or one of their groups got this permission for via
+        django-guardian; like `has_perm`, a model-level grant doesn't grant the
+        permission on every object.
+
+        If this permission defines a programmatic object check, it decides
+        instead (see `allowed_objects`). The queryset is then loaded into
+        memory to run the check, so querysets of more than
+        SERIOUS_PERMISSIONS_FILTER_QUERYSET_LIMIT objects (default: 1000, None
+        for no limit) are refused with a ValueError; filter or slice them
+        first.
+        """
+        if not user.is_active:
+            return queryset.none()
+        if user.is_superuser:
+            return queryset
+        if cls._has_object_check:
+            limit = getattr(settings, 'SERIOUS_PERMISSIONS_FILTER_QUERYSET_LIMIT', 1000)
+            objects = list(queryset if limit is None else queryset[:limit + 1])
+            if limit is not None and len(objects) > limit:
+                raise ValueError(
+                    "{}.filter_queryset() runs a programmatic object check on "
+                    "every object, and the queryset has more than {} objects. "
+                    "Filter it first, or raise the "
+                    "SERIOUS_PERMISSIONS_FILTER_QUERYSET_LIMIT setting.".format(
+                        cls.__name__, limit
+                    )
+                )
+            return queryset.filter(pk__in=[
+                obj.pk for obj in cls.allowed_objects(user, objects)
+            ])
+        if cls.model is None:
+            return queryset if cls.user_has_perm(user) else queryset.none()
+        return get_objects_for_user(
+            user, cls.__perm_str__, klass=queryset, accept_global_perms=False
+        )
+
+    @classmethod
+    def allowed_objects(cls, user, objects):
+        """
+        Returns a list of those `objects` the given user has this permission
+        for, in their original order.
+
+        Permissions can implement object checks that need related data for a
+        whole batch of objects at once by defining a classmethod
+        `has_object_permissions_bulk(user, objects)`, which must return either
+        the allowed objects or a mapping of objects to booleans. If only
+        `has_object_permission(user, obj)` is defined, it is called per object.
+        Without either, the user's django-guardian object permissions for all
+        objects are prefetched and checked.
+        """
+        objects = list(objects)
+        if not _is_instrumented():
+            return cls._allowed_objects(user, objects)
+
+        allowed, duration, queries = _measure(cls._allowed_objects, user, objects)
+        permission_checked.send(
+            sender=cls, user=user, perm=cls, obj=objects, granted=allowed,
+            path='bulk', cache_hit=None, duration=duration, queries=queries,
+        )
+        return allowed
+
+    @classmethod
+    def _allowed_objects(cls, user, objects):
+        if not user.is_active:
+            return []
+        if user.is_superuser:
+            return objects
+        if cls._has_bulk_object_check:
+            allowed = cls.has_object_permissions_bulk(user, objects)
+            if isinstance(allowed, Mapping):
+                allowed = {_object_key(obj) for obj, ok in allowed.items() if ok}
+            else:
+                allowed = {_object_key(obj) for obj in allowed}
+            return [obj for obj in objects if _object_key(obj) in allowed]
+        if cls._has_object_check:
+            return [
+                obj for obj in objects if cls.has_object_permission(user, obj)
+            ]
+        if cls.model is None:
+            # global permissions are granted on every object (see
+            # PermissionModelBackend)
+            return objects if cls.user_has_perm(user) else []
+
+        prefetch_object_permissions(user, objects)
+        checker = get_object_permission_checker(user)
+        return [
+            obj for obj in objects if checker.has_perm(cls.__perm_str__, obj)
+        ]
+
+    @classmethod
+    async def aallowed_objects(cls, user, objects):
+        """
+        Async version of `allowed_objects()`, which runs in a worker thread as
+        object checks are arbitrary synchronous code.
+        """
+        return await sync_to_async(cls.allowed_objects)(user, objects)
+
+
+def _object_key(obj):
+    """
+    Returns a hashable key identifying the given model instance: its model and
+    primary key, or its identity if it is unsaved (model instances without a
+    primary key aren't hashable).
+    """
+    if obj.pk is None:
+        return id(obj)
+    return (type(obj), obj.pk)
+
+
+class PermissionExpression(ABC):
+    """
+    A boolean combination of Permission classes, created by combining them
+    with `&`, `|` and `~`.
+
+    An expression can be used wherever a single Permission class can be
+    checked, e.g. `user.has_perm(APermission & ~BPermission)` or
+    `@permission_required(APermission | BPermission)`. PermissionModelBackend
+    evaluates all of its parts against one resolved permission set of the
+    user, or against one guardian lookup if an object is passed.
+    """
+    def __and__(self, other):
+        return AllOf(self, other)
+
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __iter__(self):
+        # see PermissionMetaclass.__iter__
+        return iter([self])
+
+    @abstractmethod
+    def evaluate(self, check):
+        """
+        Evaluates this expression, calling `check(perm)` to decide whether a
+        single Permission class is granted.
+        """
+
+    def user_has_perm(self, user, obj=None):
+        return user.has_perm(self, obj)
+
+    async def auser_has_perm(self, user, obj=None):
+        return await ahas_perm(user, self, obj)
+
+    @staticmethod
+    def _evaluate(operand, check):
+        if isinstance(operand, PermissionMetaclass):
+            return check(operand)
+        return operand.evaluate(check)
+
+    @staticmethod
+    def _validate(operand):
+        if not isinstance(operand, (PermissionMetaclass, PermissionExpression))\
+           or operand is Permission:
+            raise TypeError(
+                "Only Permission classes and expressions can be combined, "
+                "not {!r}.".format(operand)
+            )
+        return operand
+
+
+class AllOf(PermissionExpression):
+    """
+    Granted if all of the given permissions or expressions are granted.
+    """
+    def __init__(self, *operands):
+        self.operands = []
+        for operand in map(self._validate, operands):
+            if isinstance(operand, AllOf):
+                self.operands.extend(operand.operands)
+            else:
+                self.operands.append(operand)
+
+    def evaluate(self, check):
+        return all(self._evaluate(op, check) for op in self.operands)
+
+    def __str__(self):
+        return '({})'.format(' & '.join(map(str, self.operands)))
+
+
+class AnyOf(PermissionExpression):
+    """
+    Granted if any of the given permissions or expressions is granted.
+    """
+    def __init__(self, *operands):
+        self.operands = []
+        for operand in map(self._validate, operands):
+            if isinstance(operand, AnyOf):
+                self.operands.extend(operand.operands)
+            else:
+                self.operands.append(operand)
+
+    def evaluate(self, check):
+        return any(self._evaluate(op, check) for op in self.operands)
+
+    def __str__(self):
+        return '({})'.format(' | '.join(map(str, self.operands)))
+
+
+class Not(PermissionExpression):
+    """
+    Granted if the given permission or expression is not granted.
+    """
+    def __init__(self, operand):
+        self.operand = self._validate(operand)
+
+    def evaluate(self, check):
+        return not self._evaluate(self.operand, check)
+
+    def __str__(self):
+        return '~{}'.format(self.operand)
+
+
+def has_all(user, *perms, obj=None):
+    """
+    Returns whether the user has all of the given permissions.
+    """
+    return user.has_perm(AllOf(*perms), obj)
+
+
+def has_any(user, *perms, obj=None):
+    """
+    Returns whether the user has any of the given permissions.
+    """
+    return user.has_perm(AnyOf(*perms), obj)
+
+
+def _backends_have_perm(backends, user, perm, obj):
+    for backend in backends:
+        if backend.has_perm(user, perm, obj):
+            return True
+    return False
+
+
+async def ahas_perm(user, perm, obj=None):
+    """
+    Async version of `user.has_perm(perm, obj)`.
+
+    Like `User.has_perm`, grants everything to active superusers and asks
+    each authentication backend otherwise. Backends with an `ahas_perm`
+    method (like PermissionModelBackend) are awaited for model-level checks;
+    consecutive backends without one are run together in a single worker
+    thread. Object checks are synchronous in every backend, so all backends
+    check them together in a single worker thread.
+    """
+    if user.is_active and user.is_superuser:
+        return True
+    backends = [
+        backend for backend in auth.get_backends()
+        if hasattr(backend, 'ahas_perm') or hasattr(backend, 'has_perm')
+    ]
+    try:
+        if obj is not None:
+            return await sync_to_async(_backends_have_perm)(backends, user, perm, obj)
+        for is_async, group in groupby(
+            backends, key=lambda backend: hasattr(backend, 'ahas_perm')
+        ):
+            if is_async:
+                for backend in group:
+                    if await backend.ahas_perm(user, perm):
+                        return True
+            elif await sync_to_async(_backends_have_perm)(list(group), user, perm, None):
+                return True
+    except PermissionDenied:
+        return False
+    return False
+
+
+async def ahas_all(user, *perms, obj=None):
+    """
+    Async version of `has_all()`.
+    """
+    return await ahas_perm(user, AllOf(*perms), obj)
+
+
+async def ahas_any(user, *perms, obj=None):
+    """
+    Async version of `has_any()`.
+    """
+    return await ahas_perm(user, AnyOf(*perms), obj)
+
+
+def get_object_permission_checker(user_obj):
+    """
+    Returns a django-guardian ObjectPermissionChecker for the given user.
+
+    The checker is cached on the user object, just like ModelBackend caches
+    the user's permissions in `_perm_cache`, so guardian's per-object cache is
+    reused for as long as the user instance lives, i.e. usually one request.
+    """
+    try:
+        return user_obj._object_permission_checker
+    except AttributeError:
+        checker = ObjectPermissionChecker(user_obj)
+        user_obj._object_permission_checker = checker
+        return checker
+
+
+def prefetch_object_permissions(user_obj, objects):
+    """
+    Loads the object permissions the given user has on all of `objects` (a
+    queryset or list of model instances of the same model) at once, so that
+    subsequent `user_obj.has_perm(SomePermission, obj)` checks on any of them
+    don't hit the DB.
+
+    A queryset is evaluated once (filling its result cache) and its instances
+    are passed on to guardian, which would otherwise query it twice.
+
+    Returns `objects`.
+    """
+    instances = list(objects)
+    if not instances:
+        return objects
+    checker = get_object_permission_checker(user_obj)
+    if not _is_instrumented():
+        checker.prefetch_perms(instances)
+        return objects
+
+    _, duration, queries = _measure(checker.prefetch_perms, instances)
+    permission_checked.send(
+        sender=ObjectPermissionChecker, user=user_obj, perm=None, obj=instances,
+        granted=None, path='prefetch', cache_hit=None, duration=duration,
+        queries=queries,
+    )
+    return objects
+
+
+# set while an instrumented permission check runs, so that checks nested in
+# it (e.g. programmatic object checks calling `user.has_perm`) are counted as
+# part of the outer one instead of being reported separately
+_instrumented_check = ContextVar('serious_django_permissions_check', default=False)
+
+
+def _is_instrumented():
+    """
+    Returns whether the permission check about to be made should be reported
+    with the `permission_checked` signal, i.e. whether the signal has receivers
+    and no instrumented check is running already.
+    """
+    # Not Signal.has_listeners(), which takes the signal's lock and prunes
+    # dead receivers on every call. A dead weak receiver left in the list
+    # only costs measuring checks nobody receives until the next send().
+    return bool(permission_checked.receivers) and not _instrumented_check.get()
+
+
+def _measure(func, *args):
+    """
+    Calls `func(*args)` as an instrumented check and returns a tuple of its
+    result, its duration and the number of queries it ran.
+    """
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    token = _instrumented_check.set(True)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            start = time.perf_counter()
+            result = func(*args)
+            duration = time.perf_counter() - start
+    finally:
+        _instrumented_check.reset(token)
+    return result, duration, queries[0]
+
+
+def _describe_check(user_obj, perm, obj):
+    """
+    Returns the path PermissionModelBackend takes to check `perm`, and whether
+    the data it needs is already cached on the user object (None for
+    programmatic checks).
+    """
+    if obj is None:
+        return (
+            'expression' if isinstance(perm, PermissionExpression) else 'model',
+            hasattr(user_obj, '_perm_cache')
+        )
+    if isinstance(perm, PermissionExpression):
+        path = 'expression'
+    else:
+        if not isinstance(perm, PermissionMetaclass):
+            perm = Permission.registry.get(perm)
+        if perm is not None and perm._has_object_check:
+            return 'programmatic', None
+        if perm is not None and perm.model is None:
+            return 'model', hasattr(user_obj, '_perm_cache')
+        path = 'guardian'
+    return path, _guardian_cache_hit(user_obj, obj)
+
+
+def _guardian_cache_hit(user_obj, obj):
+    """
+    Returns whether django-guardian has already cached the user's object
+    permissions on `obj`, or None if that can't be told.
+    """
+    checker = getattr(user_obj, '_object_permission_checker', None)
+    if checker is None:
+        return False
+    # guardian has no public API for this, so don't break the check if its
+    # cache internals change
+    cache = getattr(checker, '_obj_perms_cache', None)
+    if cache is None:
+        return None
+    try:
+        return checker.get_local_cache_key(obj) in cache
+    except Exception:
+        return None
+
 
 class PermissionModelBackend(ModelBackend):
     def has_perm(self, user_obj, perm, obj=None):
-        if type(perm) == type(Permission) and issubclass(perm, Permission):
-            perm_str = perm.__perm_str__
-        else:
+        # _is_instrumented(), inlined as this is the hot path
+        if not permission_checked.receivers or _instrumented_check.get():
+            return self._has_perm(user_obj, perm, obj)
+
+        path, cache_hit = _describe_check(user_obj, perm, obj)
+        granted, duration, queries = _measure(self._has_perm, user_obj, perm, obj)
+        permission_checked.send(
+            sender=type(self), user=user_obj, perm=perm, obj=obj,
+            granted=granted, path=path, cache_hit=cache_hit,
+            duration=duration, queries=queries,
+        )
+        return granted
+
+    def _has_perm(self, user_obj, perm, obj):
+        # isinstance() with an ABC is slow, so rule out the common cases first
+        if not isinstance(perm, (PermissionMetaclass, str)) and \
+           isinstance(perm, PermissionExpression):
+            return self._has_expression_perm(user_obj, perm, obj)
+        if obj is not None:
+            return self._has_object_perm(user_obj, perm, obj)
+        return super().has_perm(user_obj, getattr(perm, '__perm_str__', perm))
+
+    def _has_object_perm(self, user_obj, perm, obj):
+        if not user_obj.is_active:
+            return False
+        if not isinstance(perm, PermissionMetaclass):
             perm_str = perm
+            perm = Permission.registry.get(perm_str)
+            if perm is None:
+                return get_object_permission_checker(user_obj).has_perm(perm_str, obj)
+
+        if perm._has_object_check:  # do programmatic checks…
+            return perm.has_object_permission(user_obj, obj)
+        if perm.model is None:
+            # global permissions aren't tied to a model, so they are granted
+            # on every object
+            return perm.__perm_str__ in self.get_all_permissions(user_obj)
+        # use django-guardian check if obj is passed
+        return get_object_permission_checker(user_obj).has_perm(perm.__perm_str__, obj)
+
+    def _has_expression_perm(self, user_obj, expression, obj):
+        if not user_obj.is_active:
+            return False
+
+        if obj is None:
+            perms = self.get_all_permissions(user_obj)
+            return expression.evaluate(lambda perm: perm.__perm_str__ in perms)
+
+        # guardian's checker loads all of the user's permissions on `obj` at
+        # once
+        return expression.evaluate(
+            lambda perm: self._has_object_perm(user_obj, perm, obj)
+        )
+
+    async def ahas_perm(self, user_obj, perm, obj=None):
+        """
+        Async version of `has_perm()`. Model-level checks use Django's async
+        ORM; object checks run in a worker thread, as guardian and
+        programmatic object checks are synchronous.
+        """
+        if obj is not None:
+            return await sync_to_async(self.has_perm)(user_obj, perm, obj)
+        if not _is_instrumented():
+            return await self._ahas_perm(user_obj, perm)
+
+        # the async ORM runs queries on another thread's connection, so they
+        # can't be counted here
+        path, cache_hit = _describe_check(user_obj, perm, None)
+        token = _instrumented_check.set(True)
+        try:
+            start = time.perf_counter()
+            granted = await self._ahas_perm(user_obj, perm)
+            duration = time.perf_counter() - start
+        finally:
+            _instrumented_check.reset(token)
+        permission_checked.send(
+            sender=type(self), user=user_obj, perm=perm, obj=None,
+            granted=granted, path=path, cache_hit=cache_hit,
+            duration=duration, queries=None,
+        )
+        return granted
+
+    async def _ahas_perm(self, user_obj, perm):
+        if isinstance(perm, PermissionExpression):
+            if not user_obj.is_active:
+                return False
+            perms = await self.aget_all_permissions(user_obj)
+            return perm.evaluate(lambda perm: perm.__perm_str__ in perms)
+        perm_str = getattr(perm, '__perm_str__', perm)
+        return user_obj.is_active and \
+            perm_str in await self.aget_all_permissions(user_obj)
 
-        if obj is not None:  # use django-guardian check if obj is passed
-            if "has_object_permission" in dir(perm): # do programmatic checks…
-                return perm.has_object_permission(user_obj, obj)
-            check = ObjectPermissionChecker(user_obj)
-            return check.has_perm(perm_str, obj)
+    async def aget_all_permissions(self, user_obj, obj=None):
+        """
+        Async version of `get_all_permissions()`, sharing its cache on the
+        user object.
+        """
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = {
+                *await self._aget_permissions(user_obj, 'user'),
+                *await self._aget_permissions(user_obj, 'group'),
+            }
+        return user_obj._perm_cache
+
+    async def _aget_permissions(self, user_obj, from_name):
+        # see ModelBackend._get_permissions
+        perm_cache_name = '_{}_perm_cache'.format(from_name)
+        if not hasattr(user_obj, perm_cache_name):
+            if user_obj.is_superuser:
+                perms = DjangoPermission.objects.all()
+            else:
+                perms = getattr(self, '_get_{}_permissions'.format(from_name))(user_obj)
+            perms = perms.values_list('content_type__app_label', 'codename').order_by()
+            setattr(user_obj, perm_cache_name, {
+                '{}.{}'.format(app_label, codename)
+                async for app_label, codename in perms
+            })
+        return getattr(user_obj, perm_cache_name)
+
+
+class CachedPermissionModelBackend(PermissionModelBackend):
+    """
+    A PermissionModelBackend that stores the set of permission strings of each
+    user in Django's cache framework, so that permission checks of freshly
+    loaded user objects don't hit the DB as long as the cached set is valid.
+
+    Cached sets are invalidated by version stamps that are bumped whenever the
+    permissions or groups of a user, the permissions of a group or the
+    permissions themselves change, and by the sync commands.
+    """
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = cache.user_permissions_key(user_obj.pk)
+            perms = cache.get_cache().get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.get_cache().set(key, perms)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = await sync_to_async(cache.user_permissions_key)(user_obj.pk)
+            perms = await cache.get_cache().aget(key)
+            if perms is None:
+                perms = await super().aget_all_permissions(user_obj)
+                await cache.get_cache().aset(key, perms)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+
+class MaterializedPermissionModelBackend(PermissionModelBackend):
+    """
+    A PermissionModelBackend that reads the permission strings of each user
+    from the EffectiveUserPermission table with a single indexed query,
+    instead of joining the user's permissions and groups.
+
+    Requires the SERIOUS_PERMISSIONS_MATERIALIZE setting, which keeps the
+    table up to date (see `materialized.refresh_effective_permissions`).
+    """
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            # ModelBackend grants superusers every permission
+            return super().get_all_permissions(user_obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = set(
+                EffectiveUserPermission.objects.filter(
+                    user_id=user_obj.pk
+                ).values_list('perm', flat=True)
+            )
+        return user_obj._perm_cache
 
-        return super().has_perm(user_obj, perm_str, obj)
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return await super().aget_all_permissions(user_obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = {
+                perm async for perm in EffectiveUserPermission.objects.filter(
+                    user_id=user_obj.pk
+                ).values_list('perm', flat=True)
+            }
+        return user_obj._perm_cache
@@ -0,0 +1,191 @@
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _same_declaration(a, b):
+    # a module that is imported again (e.g. reloaded) redeclares its classes
+    return (a.__module__, a.__qualname__) == (b.__module__, b.__qualname__)
+
+
+class PermissionRegistry:
+    """
+    Index of all declared Permission classes, filled by PermissionMetaclass
+    when a class is created. Available as `Permission.registry`.
+    """
+    def __init__(self):
+        self._by_perm_str = {}
+        self._by_app_label = {}
+        self._by_codename = {}
+        # classes created in lazy mode, which are configured and registered
+        # on first access
+        self._deferred = {}
+        # (class, exception) pairs of deferred classes that failed validation
+        self.errors = []
+        # incremented on every registration, to let dependent caches detect
+        # that they are outdated
+        self.generation = 0
+
+    def defer(self, perm):
+        self._deferred[perm] = None
+
+    def is_deferred(self, perm):
+        return perm in self._deferred
+
+    def resolve(self, perm):
+        """
+        Configures and registers the given deferred Permission class. If it is
+        invalid, the error is recorded in `errors` and raised.
+        """
+        del self._deferred[perm]
+        try:
+            perm._configure()
+            self.register(perm)
+        except ImproperlyConfigured as e:
+            self.errors.append((perm, e))
+            raise
+
+    def resolve_deferred(self):
+        """
+        Configures and registers all deferred Permission classes, recording
+        the errors of invalid ones in `errors`.
+        """
+        while self._deferred:
+            try:
+                self.resolve(next(iter(self._deferred)))
+            except ImproperlyConfigured:
+                pass
+
+    def unregister(self, perm):
+        self._deferred.pop(perm, None)
+        self.errors = [(p, e) for p, e in self.errors if p is not perm]
+        perm_str = perm.__dict__.get('__perm_str__')
+        if self._by_perm_str.get(perm_str) is perm:
+            del self._by_perm_str[perm_str]
+            del self._by_app_label[perm.app_label][perm_str]
+            del self._by_codename[perm.codename][perm_str]
+            self.generation += 1
+
+    def register(self, perm):
+        registered = self._by_perm_str.get(perm.__perm_str__)
+        if registered is not None and not _same_declaration(registered, perm):
+            raise ImproperlyConfigured(
+                "{}.{} and {}.{} declare the same permission '{}'.".format(
+                    registered.__module__, registered.__qualname__,
+                    perm.__module__, perm.__qualname__, perm.__perm_str__
+                )
+            )
+        self._by_perm_str[perm.__perm_str__] = perm
+        self._by_app_label.setdefault(perm.app_label, {})[perm.__perm_str__] = perm
+        self._by_codename.setdefault(perm.codename, {})[perm.__perm_str__] = perm
+        self.generation += 1
+
+    def get(self, perm_str, default=None):
+        """
+        Returns the Permission class with the given permission string, or
+        `default` if there is none.
+        """
+        self.resolve_deferred()
+        return self._by_perm_str.get(perm_str, default)
+
+    def by_perm_str(self, perm_str):
+        """
+        Returns the Permission class with the given permission string, e.g.
+        'some_app.change_something'.
+        """
+        self.resolve_deferred()
+        try:
+            return self._by_perm_str[perm_str]
+        except KeyError:
+            raise LookupError(
+                "No Permission class is declared for '{}'.".format(perm_str)
+            )
+
+    def by_app_label(self, app_label):
+        """
+        Returns all Permission classes declared by the given app.
+        """
+        self.resolve_deferred()
+        return list(self._by_app_label.get(app_label, {}).values())
+
+    def by_codename(self, codename):
+        """
+        Returns all Permission classes with the given codename (there may be
+        one per model).
+        """
+        self.resolve_deferred()
+        return list(self._by_codename.get(codename, {}).values())
+
+    def __iter__(self):
+        self.resolve_deferred()
+        return iter(list(self._by_perm_str.values()))
+
+    def __len__(self):
+        self.resolve_deferred()
+        return len(self._by_perm_str)
+
+    def __contains__(self, perm):
+        self.resolve_deferred()
+        return getattr(perm, '__perm_str__', perm) in self._by_perm_str
+
+
+class GroupRegistry:
+    """
+    Index of all declared Group classes, filled by GroupMetaclass when a class
+    is created. Available as `Group.registry`.
+    """
+    def __init__(self):
+        self._by_name = {}
+        self._by_module = {}
+        self.generation = 0
+
+    def register(self, group):
+        registered = self._by_name.get(group.group_name)
+        if registered is not None and not _same_declaration(registered, group):
+            raise ImproperlyConfigured(
+                "{}.{} and {}.{} declare the same group '{}'.".format(
+                    registered.__module__, registered.__qualname__,
+                    group.__module__, group.__qualname__, group.group_name
+                )
+            )
+        self._by_name[group.group_name] = group
+        self._by_module.setdefault(group.__module__, {})[group.group_name] = group
+        self.generation += 1
+
+    def unregister(self, group):
+        if self._by_name.get(group.group_name) is group:
+            del self._by_name[group.group_name]
+            del self._by_module[group.__module__][group.group_name]
+            self.generation += 1
+
+    def get(self, group_name, default=None):
+        """
+        Returns the Group class with the given group name, or `default` if
+        there is none.
+        """
+        return self._by_name.get(group_name, default)
+
+    def by_name(self, group_name):
+        """
+        Returns the Group class with the given group name.
+        """
+        try:
+            return self._by_name[group_name]
+        except KeyError:
+            raise LookupError(
+                "No Group class is declared for '{}'.".format(group_name)
+            )
+
+    def by_module(self, module):
+        """
+        Returns all Group classes declared in the module with the given dotted
+        path.
+        """
+        return list(self._by_module.get(module, {}).values())
+
+    def __iter__(self):
+        return iter(list(self._by_name.values()))
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, group):
+        return getattr(group, 'group_name', group) in self._by_name
@@ -0,0 +1,215 @@
+import sys
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.contrib.auth.models import Group as DjangoGroup
+from django.contrib.auth.models import Permission as DjangoPermission
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models.signals import m2m_changed, post_delete, post_migrate,\
+    post_save, pre_delete
+from django.dispatch import Signal
+
+from . import cache, helpers, materialized
+from .models import GlobalPermission, SyncFingerprint
+
+
+# Sent by PermissionModelBackend after each permission check, and by
+# Permission.get(), Permission.allowed_objects() and
+# prefetch_object_permissions(), if it has receivers, with the arguments
+# `user`, `perm`, `obj`, `granted`, `path`, `cache_hit`, `duration` and
+# `queries` (see the README).
+permission_checked = Signal()
+
+
+# The receivers below import Permission and Group when called, as the
+# permissions module imports this one for `permission_checked`.
+
+def clear_permission_cache(sender, **kwargs):
+    from .permissions import Permission
+
+    Permission.clear_cache()
+
+
+def clear_group_cache(sender, **kwargs):
+    from .groups import Group
+
+    Group.clear_cache()
+
+
+def clear_content_type_cache(sender, **kwargs):
+    from .permissions import Permission
+
+    Permission.clear_content_type_cache()
+
+
+def invalidate_all_user_permissions(sender, **kwargs):
+    cache.bump_version()
+
+
+def invalidate_user_permissions(sender, instance, **kwargs):
+    cache.bump_version([instance.pk])
+
+
+def invalidate_user_relation(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidates the cached permission sets of the users affected by a change of
+    `User.user_permissions` or `User.groups`.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        cache.bump_version([instance.pk])
+    elif pk_set is None:  # cleared from the other side, i.e. unknown users
+        cache.bump_version()
+    else:
+        cache.bump_version(pk_set)
+
+
+def refresh_materialized_relation(sender, instance, action, reverse, pk_set,
+                                  using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Refreshes the materialized permissions of the users affected by a change
+    of `User.user_permissions`, `User.groups` or `Group.permissions`, if the
+    SERIOUS_PERMISSIONS_MATERIALIZE setting is enabled.
+    """
+    if not materialized.is_enabled():
+        return
+    if action == 'pre_clear':
+        # the cleared relations are gone once post_clear is sent
+        instance._materialized_user_ids = materialized.affected_users(
+            sender, instance, reverse, pk_set, using=using
+        )
+    elif action == 'post_clear':
+        materialized.refresh_effective_permissions(
+            instance.__dict__.pop('_materialized_user_ids', ()), using=using
+        )
+    elif action in ('post_add', 'post_remove'):
+        materialized.refresh_effective_permissions(
+            materialized.affected_users(sender, instance, reverse, pk_set, using=using),
+            using=using
+        )
+
+
+def collect_materialized_users(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Remembers the users whose materialized permissions are affected by the
+    deletion of a permission or group, to refresh them once it is deleted.
+    """
+    if not materialized.is_enabled():
+        return
+    if isinstance(instance, DjangoPermission):
+        user_ids = materialized.users_with_permission(instance, using=using)
+    else:
+        user_ids = materialized.users_in_groups([instance.pk], using=using)
+    instance._materialized_user_ids = user_ids
+
+
+def refresh_materialized_users(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not materialized.is_enabled():
+        return
+    materialized.refresh_effective_permissions(
+        instance.__dict__.pop('_materialized_user_ids', ()), using=using
+    )
+
+
+def sync_on_migrate(sender, app_config, verbosity=2, using=DEFAULT_DB_ALIAS,
+                    apps=global_apps, stdout=None, **kwargs):
+    """
+    Syncs the declared permissions (and groups, if DEFAULT_GROUPS_MODULE is
+    set) after `migrate`, if the SERIOUS_PERMISSIONS_SYNC_ON_MIGRATE setting
+    is enabled.
+
+    post_migrate is sent once per app, so the sync only runs for the last one,
+    after the content types of all apps have been created. Unless the
+    declarations changed since the last sync, it costs a single query.
+    """
+    if not getattr(settings, 'SERIOUS_PERMISSIONS_SYNC_ON_MIGRATE', False):
+        return
+    app_configs = [
+        config for config in global_apps.get_app_configs()
+        if config.models_module is not None
+    ]
+    if app_config is not app_configs[-1]:
+        return
+    try:
+        # the migration state, which lacks the model if our app is unmigrated
+        apps.get_model('serious_django_permissions', 'SyncFingerprint')
+    except LookupError:
+        return
+    if not router.allow_migrate_model(using, SyncFingerprint):
+        return
+
+    if getattr(settings, 'DEFAULT_GROUPS_MODULE', None):
+        plan = helpers.create_groups(using=using)
+    else:
+        plan = helpers.create_permissions(using=using)
+    if plan is not None and verbosity >= 2:
+        (stdout or sys.stdout).write("Synced the declared permissions and groups.\n")
+
+
+def connect_signals():
+    for signal in (post_save, post_delete):
+        for sender in (DjangoPermission, GlobalPermission):
+            signal.connect(
+                clear_permission_cache, sender=sender,
+                dispatch_uid='serious_django_permissions.clear_permission_cache'
+            )
+        signal.connect(
+            clear_group_cache, sender=DjangoGroup,
+            dispatch_uid='serious_django_permissions.clear_group_cache'
+        )
+
+    User = get_user_model()
+    for field in ('user_permissions', 'groups'):
+        if hasattr(User, field):
+            m2m_changed.connect(
+                invalidate_user_relation, sender=getattr(User, field).through,
+                dispatch_uid='serious_django_permissions.invalidate_user_relation'
+            )
+    m2m_changed.connect(
+        invalidate_all_user_permissions, sender=DjangoGroup.permissions.through,
+        dispatch_uid='serious_django_permissions.invalidate_all_user_permissions'
+    )
+    post_save.connect(
+        invalidate_user_permissions, sender=User,
+        dispatch_uid='serious_django_permissions.invalidate_user_permissions'
+    )
+    for signal in (post_save, post_delete):
+        for sender in (DjangoPermission, GlobalPermission, DjangoGroup):
+            signal.connect(
+                invalidate_all_user_permissions, sender=sender,
+                dispatch_uid='serious_django_permissions.invalidate_all_user_permissions'
+            )
+    for through in [
+        getattr(User, field).through for field in ('user_permissions', 'groups')
+        if hasattr(User, field)
+    ] + [DjangoGroup.permissions.through]:
+        m2m_changed.connect(
+            refresh_materialized_relation, sender=through,
+            dispatch_uid='serious_django_permissions.refresh_materialized_relation'
+        )
+    for sender in (DjangoPermission, GlobalPermission, DjangoGroup):
+        pre_delete.connect(
+            collect_materialized_users, sender=sender,
+            dispatch_uid='serious_django_permissions.collect_materialized_users'
+        )
+        post_delete.connect(
+            refresh_materialized_users, sender=sender,
+            dispatch_uid='serious_django_permissions.refresh_materialized_users'
+        )
+
+    # migrate (and flush) may recreate content types with new primary keys
+    post_migrate.connect(
+        clear_content_type_cache,
+        dispatch_uid='serious_django_permissions.clear_content_type_cache'
+    )
+    post_delete.connect(
+        clear_content_type_cache, sender=ContentType,
+        dispatch_uid='serious_django_permissions.clear_content_type_cache'
+    )
+    post_migrate.connect(
+        sync_on_migrate,
+        dispatch_uid='serious_django_permissions.sync_on_migrate'
+    )
@@ -0,0 +1,568 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_permission_codename
+from django.contrib.auth.models import Group as DjangoGroup
+from django.contrib.auth.models import Permission as DjangoPermission
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from . import cache, materialized
+from .groups import Group
+from .models import GlobalPermission, SyncedPermission
+from .permissions import Permission
+
+
+def resolve_content_types(permissions, using=DEFAULT_DB_ALIAS, strict=True):
+    """
+    Returns a dict mapping each of the given Permission classes to the
+    ContentType it is attached to.
+
+    The content types of all permissions are loaded with a single query by
+    their natural keys; content types of model classes that don't exist yet
+    are created as by `ContentTypeManager.get_for_models`. If `strict` is
+    False, permissions whose content type cannot be resolved are left out
+    instead of raising an error.
+    """
+    manager = ContentType.objects.db_manager(using)
+
+    natural_keys = {}
+    for perm in permissions:
+        if perm.model is None:
+            if GlobalPermission.get_cached_content_type(using) is not None:
+                continue
+            opts = GlobalPermission._meta
+            natural_keys[perm] = (opts.app_label, opts.model_name)
+        elif isinstance(perm.model, str):
+            natural_keys[perm] = (perm.app_label, perm.model.lower())
+        elif isinstance(perm.model, type) and issubclass(perm.model, models.Model):
+            opts = perm.model._meta
+            natural_keys[perm] = (opts.app_label, opts.model_name)
+        elif strict:
+            raise ValueError(
+                "{}.model is not a string or models.Model subclass!".format(perm)
+            )
+
+    by_natural_key = {}
+    if natural_keys:
+        # Filter on both columns separately and match the pairs in Python, so
+        # the query stays small no matter how many models are referenced.
+        by_natural_key = {
+            (ct.app_label, ct.model): ct for ct in manager.filter(
+                app_label__in={app_label for app_label, _ in natural_keys.values()},
+                model__in={model for _, model in natural_keys.values()},
+            )
+        }
+        missing_models = {
+            perm.model for perm, key in natural_keys.items()
+            if key not in by_natural_key and isinstance(perm.model, type)
+        }
+        if missing_models:
+            for model, ct in manager.get_for_models(
+                *missing_models, for_concrete_models=False
+            ).items():
+                by_natural_key[(model._meta.app_label, model._meta.model_name)] = ct
+
+    content_types = {}
+    for perm in permissions:
+        if perm.model is None:
+            if GlobalPermission.get_cached_content_type(using) is None and \
+               natural_keys[perm] in by_natural_key:
+                GlobalPermission.set_content_type(
+                    by_natural_key[natural_keys[perm]], using
+                )
+            content_types[perm] = GlobalPermission.get_content_type(using)
+        elif perm not in natural_keys:
+            continue
+        elif natural_keys[perm] in by_natural_key:
+            content_types[perm] = by_natural_key[natural_keys[perm]]
+        elif strict:
+            raise ContentType.DoesNotExist(
+                "No content type found for {}.model = '{}'.".format(
+                    perm, perm.model
+                )
+            )
+    return content_types
+
+
+def _content_type_natural_key(perm):
+    if perm.model is None:
+        opts = GlobalPermission._meta
+    elif isinstance(perm.model, str):
+        return [perm.app_label, perm.model.lower()]
+    else:
+        opts = perm.model._meta
+    return [opts.app_label, opts.model_name]
+
+
+def _permission_declaration(perm):
+    return _content_type_natural_key(perm) + [perm.codename, perm.description]
+
+
+def _hash(data):
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def permissions_fingerprint(permissions):
+    """
+    Returns a hash of the codenames, descriptions and content types of the
+    given Permission classes, which changes whenever syncing them would change
+    the DB.
+    """
+    return _hash(sorted(_permission_declaration(perm) for perm in permissions))
+
+
+def groups_fingerprint(permissions, groups):
+    """
+    Returns a hash of the given Permission classes and of the names and
+    (flattened) permissions of the given Group classes.
+    """
+    return _hash({
+        'permissions': permissions_fingerprint(permissions),
+        'groups': sorted(
+            [group.group_name, sorted(
+                _permission_declaration(perm) for perm in group.all_permissions
+            )]
+            for group in groups
+        ),
+    })
+
+
+def _perm_str(content_type, codename):
+    return '{}.{}'.format(content_type.app_label, codename)
+
+
+class SyncPlan:
+    """
+    The changes a sync would make to the DB, as computed by `plan_permissions`
+    or `plan_groups` without writing anything. Pass it to `apply_plan` to
+    carry it out.
+
+    Permissions are identified by their permission strings and groups by
+    their names, so a plan can be printed (`as_text`) or serialized
+    (`as_dict`) as is.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        # (permission string, name) pairs
+        self.permissions_added = []
+        # (permission string, old name, new name) triples
+        self.permissions_changed = []
+        # (permission string, name) pairs
+        self.permissions_removed = []
+        self.groups_added = []
+        # (group name, permission string) pairs
+        self.memberships_added = []
+        self.memberships_removed = []
+
+        self._permissions_to_create = []
+        self._permissions_to_update = []
+        self._permissions_to_delete = []
+        # primary keys of existing declared permissions to mark as synced
+        self._permissions_to_record = []
+        self._groups_to_create = []
+        self._db_groups = {}
+        # (group name, content type id, codename) of the memberships to add
+        self._links_to_add = []
+        # through table pk -> (group id, permission id)
+        self._links_to_remove = {}
+        self._added_links = []
+
+    def __bool__(self):
+        return any((
+            self.permissions_added, self.permissions_changed,
+            self.permissions_removed, self.groups_added, self.memberships_added, self.memberships_removed,
+        ))
+
+    def as_dict(self):
+        """
+        Returns the plan as a dict of JSON-serializable lists.
+        """
+        return {
+            'permissions': {
+                'added': [
+                    {'permission': perm_str, 'name': name}
+                    for perm_str, name in self.permissions_added
+                ],
+                'changed': [
+                    {'permission': perm_str, 'old_name': old_name, 'name': name}
+                    for perm_str, old_name, name in self.permissions_changed
+                ],
+                'removed': [
+                    {'permission': perm_str, 'name': name}
+                    for perm_str, name in self.permissions_removed
+                ],
+            },
+            'groups': {
+                'added': list(self.groups_added),
+            },
+            'memberships': {
+                'added': [
+                    {'group': group_name, 'permission': perm_str}
+                    for group_name, perm_str in self.memberships_added
+                ],
+                'removed': [
+                    {'group': group_name, 'permission': perm_str}
+                    for group_name, perm_str in self.memberships_removed
+                ],
+            },
+        }
+
+    def as_text(self):
+        """
+        Returns the plan as a list of lines in a diff-like format.
+        """
+        lines = []
+        lines += [
+            '+ permission {} "{}"'.format(perm_str, name)
+            for perm_str, name in sorted(self.permissions_added)
+        ]
+        lines += [
+            '~ permission {} "{}" -> "{}"'.format(perm_str, old_name, name)
+            for perm_str, old_name, name in sorted(self.permissions_changed)
+        ]
+        lines += [
+            '- permission {} "{}"'.format(perm_str, name)
+            for perm_str, name in sorted(self.permissions_removed)
+        ]
+        lines += [
+            '+ group {}'.format(group_name)
+            for group_name in sorted(self.groups_added)
+        ]
+        lines += [
+            '+ membership {}: {}'.format(group_name, perm_str)
+            for group_name, perm_str in sorted(self.memberships_added)
+        ]
+        lines += [
+            '- membership {}: {}'.format(group_name, perm_str)
+            for group_name, perm_str in sorted(self.memberships_removed)
+        ]
+        return lines
+
+
+def _builtin_codenames(model):
+    opts = model._meta
+    return {
+        get_permission_codename(action, opts)
+        for action in opts.default_permissions
+    } | {codename for codename, _ in opts.permissions}
+
+
+def plan_permissions(permissions, using=DEFAULT_DB_ALIAS, plan=None, prune=False):
+    """
+    Returns a SyncPlan creating or updating the DB instances of all given
+    Permission classes.
+
+    All existing permissions of the involved content types are loaded with a
+    single query and diffed in memory, so the number of queries does not
+    depend on the number of permissions.
+
+    Every synced permission is recorded as a SyncedPermission. With
+    `prune=True`, the plan also deletes stale permissions: recorded
+    permissions and global permissions that are not declared as Permission
+    classes anymore. Permissions created by other means (other apps, data
+    migrations, Django) are never recorded, and Django's default permissions
+    and those declared in a model's `Meta.permissions` are never pruned.
+    """
+    if plan is None:
+        plan = SyncPlan(using=using)
+    content_types = resolve_content_types(permissions, using=using)
+
+    queryset = DjangoPermission.objects.using(using).annotate(
+        synced=Exists(SyncedPermission.objects.filter(permission=OuterRef('pk')))
+    )
+    if prune:
+        # global permissions are created by this package only, so they are
+        # prune candidates even if they were synced before they were recorded
+        global_content_type = GlobalPermission.get_content_type(using=using)
+        queryset = queryset.filter(
+            Q(content_type__in={ct.pk for ct in content_types.values()}) |
+            Q(content_type=global_content_type) | Q(synced=True)
+        ).select_related('content_type')
+    else:
+        queryset = queryset.filter(
+            content_type__in={ct.pk for ct in content_types.values()}
+        )
+    existing = {
+        (perm.content_type_id, perm.codename): perm for perm in queryset
+    }
+
+    planned = set()
+    for perm, content_type in content_types.items():
+        key = (content_type.pk, perm.codename)
+        if key in planned:
+            continue
+        planned.add(key)
+        db_perm = existing.get(key)
+        if db_perm is None:
+            plan._permissions_to_create.append(DjangoPermission(
+                codename=perm.codename,
+                content_type=content_type,
+                name=perm.description,
+            ))
+            plan.permissions_added.append(
+                (_perm_str(content_type, perm.codename), perm.description)
+            )
+            continue
+        if not db_perm.synced:
+            plan._permissions_to_record.append(db_perm.pk)
+        if db_perm.name != perm.description:
+            plan.permissions_changed.append((
+                _perm_str(content_type, perm.codename),
+                db_perm.name, perm.description
+            ))
+            db_perm.name = perm.description
+            plan._permissions_to_update.append(db_perm)
+
+    if prune:
+        builtin = {}
+        for key, db_perm in existing.items():
+            if key in planned or not (
+                db_perm.synced or db_perm.content_type_id == global_content_type.pk
+            ):
+                continue
+            model = db_perm.content_type.model_class()
+            if model is None:
+                # stale content types are left to remove_stale_contenttypes
+                continue
+            if model not in builtin:
+                builtin[model] = _builtin_codenames(model)
+            if db_perm.codename not in builtin[model]:
+                plan._permissions_to_delete.append(db_perm.pk)
+                plan.permissions_removed.append(
+                    (_perm_str(db_perm.content_type, db_perm.codename), db_perm.name)
+                )
+    return plan
+
+
+def plan_groups(groups, permissions=None, using=DEFAULT_DB_ALIAS, prune=False):
+    """
+    Returns a SyncPlan creating the DB instances of all given Group classes
+    and setting their permissions, including those of the groups they inherit
+    from or include (`all_permissions`). If `permissions` is given, the plan also
+    creates or updates (and with `prune=True`, prunes) these Permission
+    classes (see `plan_permissions`).
+
+    The existing groups and their permissions are loaded with one query each,
+    regardless of the number of groups.
+    """
+    plan = SyncPlan(using=using)
+    if permissions is not None:
+        plan_permissions(permissions, using=using, plan=plan, prune=prune)
+
+    group_names = [group.group_name for group in groups]
+    plan._db_groups = {
+        group.name: group
+        for group in DjangoGroup.objects.using(using).filter(name__in=group_names)
+    }
+    for group in groups:
+        if group.group_name not in plan._db_groups:
+            plan._groups_to_create.append(DjangoGroup(name=group.group_name))
+            plan.groups_added.append(group.group_name)
+
+    group_permissions = list({
+        perm: None for group in groups for perm in group.all_permissions
+    })
+    content_types = resolve_content_types(group_permissions, using=using)
+    wanted = {}
+    for group in groups:
+        for perm in group.all_permissions:
+            content_type = content_types[perm]
+            wanted[(group.group_name, content_type.pk, perm.codename)] = \
+                _perm_str(content_type, perm.codename)
+
+    through = DjangoGroup.permissions.through
+    existing = set()
+    for pk, group_id, group_name, permission_id, content_type_id, app_label, \
+            codename in through.objects.using(using).filter(
+                group__name__in=group_names
+            ).values_list(
+                'pk', 'group_id', 'group__name', 'permission_id',
+                'permission__content_type_id',
+                'permission__content_type__app_label', 'permission__codename'
+            ):
+        link = (group_name, content_type_id, codename)
+        existing.add(link)
+        if link not in wanted:
+            plan._links_to_remove[pk] = (group_id, permission_id)
+            plan.memberships_removed.append(
+                (group_name, '{}.{}'.format(app_label, codename))
+            )
+
+    for link, perm_str in wanted.items():
+        if link not in existing:
+            plan._links_to_add.append(link)
+            plan.memberships_added.append((link[0], perm_str))
+    return plan
+
+
+def apply_plan(plan):
+    """
+    Writes the changes of the given SyncPlan to the DB inside a transaction,
+    using one bulk statement per kind of change.
+    """
+    using = plan.using
+    through = DjangoGroup.permissions.through
+
+    with transaction.atomic(using=using):
+        if plan._permissions_to_create:
+            manager = DjangoPermission.objects.db_manager(using)
+            manager.bulk_create(plan._permissions_to_create)
+            if any(perm.pk is None for perm in plan._permissions_to_create):
+                # not every backend returns the primary keys of bulk inserts
+                keys = {
+                    (perm.content_type_id, perm.codename)
+                    for perm in plan._permissions_to_create
+                }
+                plan._permissions_to_create = [
+                    perm for perm in manager.filter(
+                        codename__in={codename for _, codename in keys},
+                        content_type__in={ct_id for ct_id, _ in keys},
+                    ) if (perm.content_type_id, perm.codename) in keys
+                ]
+        if plan._permissions_to_create or plan._permissions_to_record:
+            SyncedPermission.objects.using(using).bulk_create(
+                (SyncedPermission(permission_id=pk) for pk in
+                 plan._permissions_to_record +
+                 [perm.pk for perm in plan._permissions_to_create]),
+                ignore_conflicts=True
+            )
+        if plan._permissions_to_update:
+            DjangoPermission.objects.using(using).bulk_update(
+                plan._permissions_to_update, ['name']
+            )
+
+        if plan._groups_to_create:
+            manager = DjangoGroup.objects.db_manager(using)
+            manager.bulk_create(plan._groups_to_create)
+            if any(group.pk is None for group in plan._groups_to_create):
+                # not every backend returns the primary keys of bulk inserts
+                plan._groups_to_create = list(manager.filter(
+                    name__in=[group.name for group in plan._groups_to_create]
+                ))
+            plan._db_groups.update(
+                (group.name, group) for group in plan._groups_to_create
+            )
+
+        if plan._links_to_add:
+            db_permissions = {
+                (content_type_id, codename): pk
+                for pk, content_type_id, codename in
+                DjangoPermission.objects.using(using).filter(
+                    codename__in={codename for _, _, codename in plan._links_to_add},
+                    content_type__in={ct_id for _, ct_id, _ in plan._links_to_add},
+                ).values_list('pk', 'content_type_id', 'codename')
+            }
+            plan._added_links = []
+            for (group_name, content_type_id, codename), (_, perm_str) in zip(
+                plan._links_to_add, plan.memberships_added
+            ):
+                try:
+                    permission_id = db_permissions[(content_type_id, codename)]
+                except KeyError:
+                    raise DjangoPermission.DoesNotExist(
+                        "{} does not exist in the DB.".format(perm_str)
+                    )
+                plan._added_links.append(
+                    (plan._db_groups[group_name].pk, permission_id)
+                )
+            through.objects.using(using).bulk_create(
+                through(group_id=group_id, permission_id=permission_id)
+                for group_id, permission_id in plan._added_links
+            )
+        if plan._links_to_remove:
+            through.objects.using(using).filter(
+                pk__in=list(plan._links_to_remove)
+            ).delete()
+
+    if materialized.is_enabled():
+        # the through table is written in bulk, without m2m_changed signals
+        group_ids = {group_id for group_id, _ in plan._added_links} | {
+            group_id for group_id, _ in plan._links_to_remove.values()
+        }
+        if group_ids:
+            materialized.refresh_effective_permissions(
+                materialized.users_in_groups(group_ids, using=using), using=using
+            )
+
+    if plan._permissions_to_delete:
+        delete_permissions(plan._permissions_to_delete, using=using)
+
+    Permission.clear_cache()
+    Group.clear_cache()
+    cache.bump_version()
+
+
+def _permission_references():
+    # (model, field name) of every foreign key to Permission, including the
+    # through tables of many-to-many fields (e.g. Group.permissions and
+    # User.user_permissions) and django-guardian's object permissions
+    for rel in DjangoPermission._meta.related_objects:
+        if rel.many_to_many:
+            yield rel.through, rel.field.m2m_reverse_field_name()
+        else:
+            yield rel.related_model, rel.field.name
+
+
+def delete_permissions(pks, using=DEFAULT_DB_ALIAS, batch_size=None):
+    """
+    Deletes the permissions with the given primary keys and all rows
+    referencing them.
+
+    The referencing rows are deleted first, with one DELETE per batch of at
+    most `batch_size` rows (default: the SERIOUS_PERMISSIONS_PRUNE_BATCH_SIZE
+    setting, or 10000), each in its own transaction, so large object
+    permission tables are never locked for long.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'SERIOUS_PERMISSIONS_PRUNE_BATCH_SIZE', 10000)
+    pks = list(pks)
+
+    for model, field_name in _permission_references():
+        queryset = model._base_manager.using(using).filter(
+            **{'{}__in'.format(field_name): pks}
+        )
+        while True:
+            batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            model._base_manager.using(using).filter(pk__in=batch).delete()
+
+    for i in range(0, len(pks), batch_size):
+        DjangoPermission.objects.using(using).filter(
+            pk__in=pks[i:i + batch_size]
+        ).delete()
+
+
+def sync_permissions(permissions, using=DEFAULT_DB_ALIAS, prune=False):
+    """
+    Creates or updates (and with `prune=True`, prunes) the DB instances of all
+    given Permission classes (see `plan_permissions`).
+
+    Returns a tuple `(created, updated)` of lists of DB instances.
+    """
+    plan = plan_permissions(permissions, using=using, prune=prune)
+    apply_plan(plan)
+    return plan._permissions_to_create, plan._permissions_to_update
+
+
+def sync_groups(groups, using=DEFAULT_DB_ALIAS):
+    """
+    Creates the DB instances of all given Group classes and sets their
+    permissions (see `plan_groups`). The permissions must already exist in the
+    DB (see `sync_permissions`).
+
+    Returns a tuple `(created, added, removed)`, containing the created
+    DjangoGroup instances and the added and removed `(group_id,
+    permission_id)` pairs.
+    """
+    plan = plan_groups(groups, using=using)
+    apply_plan(plan)
+    return (
+        plan._groups_to_create, plan._added_links,
+        list(plan._links_to_remove.values())
+    )
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+
+from .instrumentation import track_permission_checks
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+
+def _failure_message(tracker, num):
+    lines = ['{} permission queries, expected at most {}:'.format(
+        tracker.queries, num
+    )]
+    for label, total in tracker.by_permission().items():
+        if total['queries']:
+            lines.append('  {}: {} queries in {} checks'.format(
+                label, total['queries'], total['count']
+            ))
+    return '\n'.join(lines)
+
+
+@contextmanager
+def max_permission_queries(num):
+    """
+    Fails with an AssertionError if the permission checks made inside the
+    block ran more than `num` queries, listing the queries per permission.
+    Yields the PermissionCheckTracker holding the checks.
+
+    Only the queries of checks made through PermissionModelBackend (including
+    its django-guardian object checks), `Permission.get()`,
+    `Permission.allowed_objects()` and `prefetch_object_permissions()` are
+    counted.
+    """
+    with track_permission_checks() as tracker:
+        yield tracker
+    if tracker.queries > num:
+        raise AssertionError(_failure_message(tracker, num))
+
+
+class PermissionQueriesTestMixin:
+    """
+    Adds `assertMaxPermissionQueries` to a TestCase.
+    """
+    def assertMaxPermissionQueries(self, num, func=None, *args, **kwargs):
+        """
+        Asserts that the permission checks made inside the `with` block, or by
+        calling `func(*args, **kwargs)`, run at most `num` queries (see
+        `max_permission_queries`).
+        """
+        context = max_permission_queries(num)
+        if func is None:
+            return context
+        with context:
+            func(*args, **kwargs)
+
+
+if pytest is not None:
+    @pytest.fixture
+    def assert_max_permission_queries():
+        """
+        Returns `max_permission_queries`. Enable the fixture with
+        `pytest_plugins = ['serious_django_permissions.testing']` in the
+        root conftest.py.
+        """
+        return max_permission_queries
@@ -0,0 +1,9 @@
+from serious_django_permissions.groups import Group
+
+from test_app.permissions_extra import ExtraRestrictedModelPermission
+
+
+class ExtraGroup(Group):
+    permissions = [
+        ExtraRestrictedModelPermission
+    ]
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.db import models
 
 class RestrictedModel(models.Model):
-    pass
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.CASCADE
+    )
 
 class UnrestrictedModel(models.Model):
     pass
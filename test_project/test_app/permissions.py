@@ -1,3 +1,5 @@
+from django.contrib.auth import get_user_model
+
 from serious_django_permissions.permissions import Permission
 
 from .models import RestrictedModel
@@ -16,3 +18,27 @@ class GlobalPermission(Permission):
 class ExplicitReferenceToRestrictedModelPermission(Permission):
     model = RestrictedModel
     description = 'Enables the user to write in RestrictedModel, with explicit reference to model class'
+
+
+class OwnRestrictedModelPermission(Permission):
+    model = RestrictedModel
+    description = 'Enables the user to write in RestrictedModel instances they own'
+
+    @classmethod
+    def has_object_permission(cls, user, obj):
+        return obj.owner_id == user.pk
+
+
+class ActiveOwnerRestrictedModelPermission(Permission):
+    model = RestrictedModel
+    description = 'Enables the user to write in RestrictedModel instances owned by active users'
+
+    @classmethod
+    def has_object_permissions_bulk(cls, user, objs):
+        active_owners = set(
+            get_user_model().objects.filter(
+                pk__in={obj.owner_id for obj in objs},
+                is_active=True,
+            ).values_list('pk', flat=True)
+        )
+        return {obj: obj.owner_id in active_owners for obj in objs}
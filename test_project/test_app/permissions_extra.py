@@ -0,0 +1,9 @@
+from serious_django_permissions.permissions import Permission
+
+from .models import RestrictedModel
+
+
+# Only imported by groups_extra, not by the app's permissions module
+class ExtraRestrictedModelPermission(Permission):
+    model = RestrictedModel
+    description = 'Declared outside of the permissions module'
@@ -1,18 +1,40 @@
+import asyncio
+import json
+from io import StringIO
+from unittest import skipIf
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import Permission
 from django.core.exceptions import ImproperlyConfigured
 from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from serious_django_permissions.management.commands import create_permissions, create_groups
-from serious_django_permissions.helpers import setup_permissions
+from serious_django_permissions.helpers import setup_permissions, find_permissions,\
+    find_groups
+from serious_django_permissions.bitmask import PermissionBitmask, permission_index
+from serious_django_permissions.permissions import PermissionModelBackend,\
+    prefetch_object_permissions, has_all, has_any, ahas_perm, ahas_any
+from serious_django_permissions.models import SyncFingerprint, SyncedPermission
+from serious_django_permissions.sync import sync_permissions, sync_groups
+from serious_django_permissions.testing import PermissionQueriesTestMixin
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
 
 from .permissions import RestrictedModelPermission, GlobalPermission,\
-    ExplicitReferenceToRestrictedModelPermission
-from .groups import AuthorizedGroup, AuthorizedGlobalPermissionGroup
+    ExplicitReferenceToRestrictedModelPermission, OwnRestrictedModelPermission,\
+    ActiveOwnerRestrictedModelPermission
+from .groups import AuthorizedGroup, AuthorizedGlobalPermissionGroup,\
+    UnauthorizedGroup
 from .views import restricted_model_view, restricted_global_view,\
-    restricted_model_with_explicit_reference_view
+    restricted_model_with_explicit_reference_view, restricted_combined_view
 
 
 class StringRepresentationTests(TestCase):
@@ -88,6 +110,25 @@ class ManageFunctionTests(TestCase):
         # Restore DEFAULT_GROUPS_MODULE setting
         settings.DEFAULT_GROUPS_MODULE = 'test_app.groups'
 
+    def test_permissions_imported_by_the_groups_module(self):
+        import sys
+        from serious_django_permissions.groups import Group as BaseGroup
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        with self.settings(DEFAULT_GROUPS_MODULE='test_app.groups_extra'):
+            create_groups.Command().handle()
+
+        from .groups_extra import ExtraGroup
+        from .permissions_extra import ExtraRestrictedModelPermission
+        for module in ('test_app.groups_extra', 'test_app.permissions_extra'):
+            self.addCleanup(sys.modules.pop, module)
+        self.addCleanup(BaseGroup.registry.unregister, ExtraGroup)
+        self.addCleanup(BasePermission.registry.unregister, ExtraRestrictedModelPermission)
+        self.assertEqual(
+            list(ExtraGroup.get().permissions.all()),
+            [ExtraRestrictedModelPermission.get()]
+        )
+
     def test_global_permission_manager(self):
         from serious_django_permissions.models import GlobalPermission
         create_permissions.Command().handle()
@@ -299,3 +340,1412 @@ class ObjectBasedPermissionsTests(TestCase):
                 obj=model_instance_b
             )
         )
+
+
+class PermissionSyncTests(TestCase):
+    def test_query_count_does_not_depend_on_number_of_permissions(self):
+        # warm up the ContentType cache
+        sync_permissions(find_permissions())
+        Permission.objects.filter(
+            codename__in=[p.codename for p in find_permissions()]
+        ).delete()
+
+        with CaptureQueriesContext(connection) as single:
+            sync_permissions([RestrictedModelPermission])
+        Permission.objects.filter(
+            codename=RestrictedModelPermission.codename
+        ).delete()
+        with CaptureQueriesContext(connection) as many:
+            sync_permissions(find_permissions())
+
+        self.assertEqual(len(single), len(many))
+
+    def test_sync_creates_and_updates_permissions(self):
+        created, updated = sync_permissions(find_permissions())
+        self.assertEqual(len(created), len(find_permissions()))
+        self.assertEqual(updated, [])
+
+        Permission.objects.filter(
+            codename=GlobalPermission.codename
+        ).update(name='outdated description')
+
+        created, updated = sync_permissions(find_permissions())
+        self.assertEqual(created, [])
+        self.assertEqual([p.codename for p in updated], [GlobalPermission.codename])
+        self.assertEqual(GlobalPermission.get().name, GlobalPermission.description)
+
+    def test_second_sync_does_not_write(self):
+        sync_permissions(find_permissions())
+
+        with CaptureQueriesContext(connection) as queries:
+            created, updated = sync_permissions(find_permissions())
+        self.assertEqual((created, updated), ([], []))
+        self.assertFalse(any(
+            q['sql'].startswith(('INSERT', 'UPDATE')) for q in queries
+        ))
+
+
+class GroupSyncTests(TestCase):
+    def setUp(self):
+        sync_permissions(find_permissions())
+
+    def test_query_count_does_not_depend_on_number_of_groups(self):
+        with CaptureQueriesContext(connection) as single:
+            sync_groups([AuthorizedGroup])
+        Group.objects.all().delete()
+        with CaptureQueriesContext(connection) as many:
+            sync_groups(find_groups())
+
+        self.assertEqual(len(single), len(many))
+
+    def test_sync_sets_group_permissions(self):
+        created, added, removed = sync_groups(find_groups())
+        self.assertEqual(
+            {g.name for g in created},
+            {g.group_name for g in find_groups()}
+        )
+        self.assertEqual(len(added), 2)
+        self.assertEqual(removed, [])
+
+        group = AuthorizedGroup.get()
+        self.assertEqual(list(group.permissions.all()), [RestrictedModelPermission.get()])
+
+        unauthorized = UnauthorizedGroup.get()
+        unauthorized.permissions.add(GlobalPermission.get())
+
+        created, added, removed = sync_groups(find_groups())
+        self.assertEqual((created, added), ([], []))
+        self.assertEqual(removed, [(unauthorized.pk, GlobalPermission.get().pk)])
+        self.assertFalse(unauthorized.permissions.exists())
+
+
+class GroupHierarchyTests(TestCase):
+    def declare_group(self, name, **attrs):
+        from serious_django_permissions.groups import Group as BaseGroup
+
+        attrs['__module__'] = 'test_app.tests'
+        cls = type(name, (attrs.pop('base', BaseGroup),), attrs)
+        self.addCleanup(BaseGroup.registry.unregister, cls)
+        return cls
+
+    def test_inherited_and_included_permissions(self):
+        viewers = self.declare_group(
+            'HierarchyViewersGroup', permissions=[RestrictedModelPermission]
+        )
+        editors = self.declare_group(
+            'HierarchyEditorsGroup', base=viewers,
+            permissions=[ExplicitReferenceToRestrictedModelPermission]
+        )
+        admins = self.declare_group(
+            'HierarchyAdminsGroup', includes=[editors, AuthorizedGroup],
+            permissions=[GlobalPermission]
+        )
+        self.assertEqual(editors.group_name, 'hierarchy_editors')
+        self.assertEqual(editors.all_permissions, [
+            ExplicitReferenceToRestrictedModelPermission, RestrictedModelPermission
+        ])
+        self.assertEqual(admins.all_permissions, [
+            GlobalPermission, ExplicitReferenceToRestrictedModelPermission,
+            RestrictedModelPermission
+        ])
+
+        sync_permissions(find_permissions())
+        sync_groups([admins])
+        self.assertEqual(
+            set(admins.get().permissions.all()),
+            {GlobalPermission.get(), RestrictedModelPermission.get(),
+             ExplicitReferenceToRestrictedModelPermission.get()}
+        )
+
+    def test_group_with_only_includes(self):
+        group = self.declare_group('HierarchyIncludingGroup', includes=[AuthorizedGroup])
+        self.assertEqual(group.all_permissions, [RestrictedModelPermission])
+
+    def test_subclass_of_group_with_only_includes(self):
+        group = self.declare_group('HierarchyRoleGroup', includes=[AuthorizedGroup])
+        subgroup = self.declare_group('HierarchySubRoleGroup', base=group)
+        self.assertEqual(subgroup.group_name, 'hierarchy_sub_role')
+        self.assertEqual(subgroup.all_permissions, [RestrictedModelPermission])
+
+    def test_invalid_includes(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.declare_group('HierarchyInvalidGroup', includes=[RestrictedModelPermission])
+
+    def test_includes_are_frozen(self):
+        group = self.declare_group('HierarchyFrozenGroup', includes=[AuthorizedGroup])
+        self.assertEqual(group.includes, (AuthorizedGroup,))
+
+    def test_unregister(self):
+        from serious_django_permissions.groups import Group as BaseGroup
+
+        group = self.declare_group('HierarchyUnregisteredGroup', permissions=[])
+        self.assertIn(group, BaseGroup.registry)
+        BaseGroup.registry.unregister(group)
+        self.assertNotIn(group, BaseGroup.registry)
+        self.assertNotIn(group, BaseGroup.registry.by_module('test_app.tests'))
+
+
+class GlobalPermissionLookupTests(TestCase):
+    def setUp(self):
+        setup_permissions()
+
+    def test_lookup_does_not_depend_on_description(self):
+        Permission.objects.filter(
+            codename=GlobalPermission.codename
+        ).update(name='outdated description')
+        self.assertEqual(GlobalPermission.get().codename, GlobalPermission.codename)
+
+    def test_in_bulk_by_codename(self):
+        from serious_django_permissions.models import GlobalPermission as GlobalPermissionModel
+
+        GlobalPermissionModel.get_content_type()
+        with self.assertNumQueries(1):
+            perms = GlobalPermissionModel.objects.in_bulk_by_codename(
+                [GlobalPermission.codename, 'test_app.undeclared']
+            )
+        self.assertEqual(perms, {GlobalPermission.codename: GlobalPermission.get()})
+
+
+class ContentTypeCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.contenttypes.models import ContentType
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        setup_permissions()
+        ContentType.objects.clear_cache()
+        BasePermission.clear_content_type_cache()
+
+    def test_content_types_are_warmed_in_bulk(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        with self.assertNumQueries(1):
+            BasePermission.warm_content_types()
+        with self.assertNumQueries(0):
+            for perm in find_permissions():
+                perm.get_content_type()
+
+    def test_string_model_lookup_is_memoized(self):
+        RestrictedModelPermission.get()
+        with self.assertNumQueries(1):
+            RestrictedModelPermission.get()
+
+    def test_global_permission_content_type_is_memoized(self):
+        from serious_django_permissions.models import GlobalPermission as GlobalPermissionModel
+
+        GlobalPermissionModel.get_content_type()
+        with self.assertNumQueries(0):
+            GlobalPermissionModel.objects.all()
+            GlobalPermissionModel.get_content_type()
+
+    def test_cache_is_cleared_by_content_type_deletion(self):
+        from django.contrib.contenttypes.models import ContentType
+        from serious_django_permissions.permissions import _content_types
+
+        RestrictedModelPermission.get_content_type()
+        ContentType.objects.create(app_label='test_app', model='removedmodel').delete()
+        self.assertEqual(_content_types, {})
+
+
+@override_settings(SERIOUS_PERMISSIONS_CACHE_LOOKUPS=True)
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        setup_permissions()
+        self.addCleanup(ExplicitReferenceToRestrictedModelPermission.clear_cache)
+        self.addCleanup(AuthorizedGroup.clear_cache)
+
+    def test_permission_lookup_is_memoized(self):
+        perm = ExplicitReferenceToRestrictedModelPermission.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(ExplicitReferenceToRestrictedModelPermission.get(), perm)
+
+    def test_group_lookup_is_memoized(self):
+        group = AuthorizedGroup.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(AuthorizedGroup.get(), group)
+            self.assertEqual(int(AuthorizedGroup), group.pk)
+
+    def test_cache_is_invalidated_on_save_and_delete(self):
+        perm = ExplicitReferenceToRestrictedModelPermission.get()
+        perm.save()
+        with self.assertNumQueries(1):
+            ExplicitReferenceToRestrictedModelPermission.get()
+
+        AuthorizedGroup.get().delete()
+        with self.assertRaises(Group.DoesNotExist):
+            AuthorizedGroup.get()
+
+    def test_cache_is_invalidated_by_sync(self):
+        ExplicitReferenceToRestrictedModelPermission.get()
+        setup_permissions(force=True)
+        with self.assertNumQueries(1):
+            ExplicitReferenceToRestrictedModelPermission.get()
+
+    def test_clear_cache(self):
+        ExplicitReferenceToRestrictedModelPermission.get()
+        ExplicitReferenceToRestrictedModelPermission.clear_cache()
+        with self.assertNumQueries(1):
+            ExplicitReferenceToRestrictedModelPermission.get()
+
+
+class ProgrammaticObjectPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import RestrictedModel
+
+        cls.owner = get_user_model().objects.create(username='owner')
+        cls.other_user = get_user_model().objects.create(username='other_user')
+        cls.instance = RestrictedModel.objects.create(owner=cls.owner)
+
+    def test_object_check_is_precomputed(self):
+        self.assertTrue(OwnRestrictedModelPermission._has_object_check)
+        self.assertFalse(RestrictedModelPermission._has_object_check)
+
+    def test_programmatic_object_check(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                PermissionModelBackend().has_perm(
+                    self.owner, OwnRestrictedModelPermission, self.instance
+                )
+            )
+            self.assertFalse(
+                PermissionModelBackend().has_perm(
+                    self.other_user, OwnRestrictedModelPermission, self.instance
+                )
+            )
+
+
+class ObjectPermissionCheckerReuseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from guardian.models import UserObjectPermission
+        from .models import RestrictedModel
+
+        create_permissions.Command().handle()
+        cls.perm = RestrictedModelPermission.get()
+        cls.instances = [RestrictedModel.objects.create() for _ in range(5)]
+        cls.user_pk = get_user_model().objects.create(username='user').pk
+        for instance in cls.instances[:3]:
+            UserObjectPermission.objects.assign_perm(
+                cls.perm, get_user_model()(pk=cls.user_pk), instance
+            )
+
+    def setUp(self):
+        # a fresh user instance, as it would be loaded for a request
+        self.user = get_user_model().objects.get(pk=self.user_pk)
+
+    def test_checker_is_reused_per_user_instance(self):
+        instance = self.instances[0]
+        self.assertTrue(self.user.has_perm(RestrictedModelPermission, instance))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.user.has_perm(RestrictedModelPermission, instance))
+
+    def test_prefetch_object_permissions(self):
+        from .models import RestrictedModel
+
+        queryset = prefetch_object_permissions(
+            self.user, RestrictedModel.objects.order_by('pk')
+        )
+        # checked on the backend directly, as guardian's own backend (also
+        # configured in this project) doesn't share the cached checker
+        backend = PermissionModelBackend()
+        with self.assertNumQueries(0):
+            allowed = [
+                backend.has_perm(self.user, RestrictedModelPermission, instance)
+                for instance in queryset
+            ]
+        self.assertEqual(allowed, [True, True, True, False, False])
+
+    def test_prefetch_evaluates_a_queryset_once(self):
+        from .models import RestrictedModel
+
+        queryset = RestrictedModel.objects.order_by('pk')
+        # the queryset, then the user's and their groups' object permissions
+        with self.assertNumQueries(3):
+            prefetch_object_permissions(self.user, queryset)
+            self.assertEqual(len(queryset), 5)
+
+
+class FilterQuerysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from guardian.models import UserObjectPermission, GroupObjectPermission
+        from .models import RestrictedModel
+
+        setup_permissions()
+        cls.perm = RestrictedModelPermission.get()
+        cls.user = get_user_model().objects.create(username='user')
+        cls.other_user = get_user_model().objects.create(username='other_user')
+        cls.instances = [
+            RestrictedModel.objects.create(owner=cls.user if i % 2 else None)
+            for i in range(5)
+        ]
+        UserObjectPermission.objects.assign_perm(
+            cls.perm, cls.user, cls.instances[0]
+        )
+        group = UnauthorizedGroup.get()
+        cls.user.groups.add(group)
+        GroupObjectPermission.objects.assign_perm(
+            cls.perm, group, cls.instances[2]
+        )
+
+    def setUp(self):
+        from .models import RestrictedModel
+
+        self.queryset = RestrictedModel.objects.order_by('pk')
+
+    def test_object_permissions_of_user_and_groups(self):
+        self.assertEqual(
+            list(RestrictedModelPermission.filter_queryset(self.user, self.queryset)),
+            [self.instances[0], self.instances[2]]
+        )
+        self.assertEqual(
+            list(RestrictedModelPermission.filter_queryset(self.other_user, self.queryset)),
+            []
+        )
+
+    def test_agrees_with_has_perm_and_allowed_objects(self):
+        self.other_user.user_permissions.add(self.perm)
+        superuser = get_user_model().objects.create(username='admin', is_superuser=True)
+        for user, expected in (
+            (self.user, [self.instances[0], self.instances[2]]),
+            (get_user_model().objects.get(pk=self.other_user.pk), []),
+            (superuser, self.instances),
+        ):
+            self.assertEqual(
+                list(RestrictedModelPermission.filter_queryset(user, self.queryset)),
+                expected
+            )
+            self.assertEqual(
+                [obj for obj in self.instances if user.has_perm(RestrictedModelPermission, obj)],
+                expected
+            )
+            self.assertEqual(
+                RestrictedModelPermission.allowed_objects(user, self.instances), expected
+            )
+
+        # global permissions are granted on every object
+        self.other_user.user_permissions.add(GlobalPermission.get())
+        for user, expected in (
+            (get_user_model().objects.get(pk=self.other_user.pk), self.instances),
+            (self.user, []),
+        ):
+            self.assertEqual(
+                list(GlobalPermission.filter_queryset(user, self.queryset)), expected
+            )
+            self.assertEqual(
+                [obj for obj in self.instances if user.has_perm(GlobalPermission, obj)],
+                expected
+            )
+            self.assertEqual(GlobalPermission.allowed_objects(user, self.instances), expected)
+
+        # inactive users have no permissions, even on objects they own
+        inactive = get_user_model().objects.get(pk=self.user.pk)
+        inactive.is_active = False
+        for perm in (OwnRestrictedModelPermission, RestrictedModelPermission, GlobalPermission):
+            self.assertEqual(list(perm.filter_queryset(inactive, self.queryset)), [])
+            self.assertEqual(
+                [obj for obj in self.instances if inactive.has_perm(perm, obj)], []
+            )
+            self.assertEqual(perm.allowed_objects(inactive, self.instances), [])
+
+    def test_programmatic_check_refuses_large_querysets(self):
+        with self.settings(SERIOUS_PERMISSIONS_FILTER_QUERYSET_LIMIT=4):
+            with self.assertRaises(ValueError):
+                OwnRestrictedModelPermission.filter_queryset(self.user, self.queryset)
+            self.assertEqual(
+                list(OwnRestrictedModelPermission.filter_queryset(
+                    self.user, self.queryset.filter(pk__in=[obj.pk for obj in self.instances[:4]])
+                )),
+                [self.instances[1], self.instances[3]]
+            )
+
+    def test_global_permission(self):
+        self.other_user.user_permissions.add(GlobalPermission.get())
+        self.assertEqual(
+            list(GlobalPermission.filter_queryset(self.other_user, self.queryset)),
+            self.instances
+        )
+        self.assertEqual(
+            list(GlobalPermission.filter_queryset(self.user, self.queryset)),
+            []
+        )
+
+    def test_programmatic_permission(self):
+        self.assertEqual(
+            list(OwnRestrictedModelPermission.filter_queryset(self.user, self.queryset)),
+            [self.instances[1], self.instances[3]]
+        )
+
+
+class BulkObjectPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import RestrictedModel
+
+        cls.user = get_user_model().objects.create(username='user')
+        active = get_user_model().objects.create(username='active')
+        inactive = get_user_model().objects.create(
+            username='inactive', is_active=False
+        )
+        cls.instances = [
+            RestrictedModel.objects.create(owner=owner)
+            for owner in (active, inactive, active, None)
+        ]
+
+    def test_bulk_check_runs_once_for_all_objects(self):
+        with self.assertNumQueries(1):
+            allowed = ActiveOwnerRestrictedModelPermission.allowed_objects(
+                self.user, self.instances
+            )
+        self.assertEqual(allowed, [self.instances[0], self.instances[2]])
+
+    def test_single_object_check_uses_bulk_check(self):
+        self.assertTrue(ActiveOwnerRestrictedModelPermission._has_object_check)
+        self.assertTrue(self.user.has_perm(
+            ActiveOwnerRestrictedModelPermission, self.instances[0]
+        ))
+        self.assertFalse(self.user.has_perm(
+            ActiveOwnerRestrictedModelPermission, self.instances[1]
+        ))
+
+    def test_unsaved_objects(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+        from .models import RestrictedModel
+
+        perm = type('UnsavedOwnerRestrictedModelPermission', (BasePermission,), {
+            '__module__': 'test_app.tests',
+            'model': 'RestrictedModel',
+            'description': 'Allows objects without an owner',
+            'has_object_permissions_bulk': classmethod(
+                lambda cls, user, objs: [obj for obj in objs if obj.owner_id is None]
+            ),
+        })
+        self.addCleanup(BasePermission.registry.unregister, perm)
+        objects = [RestrictedModel(), RestrictedModel(owner=self.user), RestrictedModel()]
+        self.assertEqual(perm.allowed_objects(self.user, objects), [objects[0], objects[2]])
+
+    def test_falls_back_to_per_object_check(self):
+        self.instances[3].owner = self.user
+        self.assertEqual(
+            OwnRestrictedModelPermission.allowed_objects(self.user, self.instances),
+            [self.instances[3]]
+        )
+
+    def test_falls_back_to_guardian(self):
+        from guardian.models import UserObjectPermission
+
+        create_permissions.Command().handle()
+        UserObjectPermission.objects.assign_perm(
+            RestrictedModelPermission.get(), self.user, self.instances[1]
+        )
+        with self.assertNumQueries(2):
+            allowed = RestrictedModelPermission.allowed_objects(
+                self.user, self.instances
+            )
+        self.assertEqual(allowed, [self.instances[1]])
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=[
+        'serious_django_permissions.permissions.CachedPermissionModelBackend'
+    ],
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }},
+)
+class CachedPermissionModelBackendTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        setup_permissions()
+        cache.clear()
+        self.user_pk = get_user_model().objects.create(username='user').pk
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user_pk)
+
+    def assertCachedPerm(self, perm, expected):
+        user = self.fresh_user()
+        self.assertEqual(user.has_perm(perm), expected)
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(user.has_perm(perm), expected)
+
+    def test_warm_checks_do_not_hit_the_db(self):
+        self.assertCachedPerm(RestrictedModelPermission, False)
+
+    def test_async_checks_share_the_cache(self):
+        from asgiref.sync import async_to_sync
+
+        self.fresh_user().user_permissions.add(RestrictedModelPermission.get())
+        self.assertTrue(
+            async_to_sync(ahas_perm)(self.fresh_user(), RestrictedModelPermission)
+        )
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm(RestrictedModelPermission))
+
+    def test_invalidated_by_user_permissions(self):
+        self.assertCachedPerm(RestrictedModelPermission, False)
+        self.fresh_user().user_permissions.add(RestrictedModelPermission.get())
+        self.assertCachedPerm(RestrictedModelPermission, True)
+        RestrictedModelPermission.get().user_set.clear()
+        self.assertCachedPerm(RestrictedModelPermission, False)
+
+    def test_invalidated_by_groups(self):
+        self.assertCachedPerm(GlobalPermission, False)
+        AuthorizedGlobalPermissionGroup.get().user_set.add(self.fresh_user())
+        self.assertCachedPerm(GlobalPermission, True)
+
+    def test_invalidated_by_group_permissions(self):
+        group = UnauthorizedGroup.get()
+        self.fresh_user().groups.add(group)
+        self.assertCachedPerm(RestrictedModelPermission, False)
+        group.permissions.add(RestrictedModelPermission.get())
+        self.assertCachedPerm(RestrictedModelPermission, True)
+
+        # the sync writes the through table in bulk, without m2m signals
+        setup_permissions(force=True)
+        self.assertCachedPerm(RestrictedModelPermission, False)
+
+
+@override_settings(
+    SERIOUS_PERMISSIONS_MATERIALIZE=True,
+    AUTHENTICATION_BACKENDS=[
+        'serious_django_permissions.permissions.MaterializedPermissionModelBackend'
+    ],
+)
+class MaterializedPermissionTests(TestCase):
+    def setUp(self):
+        setup_permissions()
+        self.user_pk = get_user_model().objects.create(username='user').pk
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user_pk)
+
+    def effective_perms(self):
+        from serious_django_permissions.models import EffectiveUserPermission
+
+        return set(EffectiveUserPermission.objects.filter(
+            user_id=self.user_pk
+        ).values_list('perm', flat=True))
+
+    def test_refresh(self):
+        from serious_django_permissions.materialized import refresh_effective_permissions
+
+        with self.settings(SERIOUS_PERMISSIONS_MATERIALIZE=False):
+            user = self.fresh_user()
+            user.user_permissions.add(RestrictedModelPermission.get())
+            user.groups.add(AuthorizedGlobalPermissionGroup.get())
+        self.assertEqual(self.effective_perms(), set())
+
+        self.assertEqual(refresh_effective_permissions(), (2, 0))
+        self.assertEqual(self.effective_perms(), {
+            RestrictedModelPermission.__perm_str__, GlobalPermission.__perm_str__
+        })
+        self.assertEqual(refresh_effective_permissions([self.user_pk]), (0, 0))
+
+    def test_backend_reads_materialized_permissions(self):
+        self.fresh_user().user_permissions.add(RestrictedModelPermission.get())
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(user.has_perm(RestrictedModelPermission))
+            self.assertFalse(user.has_perm(GlobalPermission))
+
+    def test_maintained_by_user_relations(self):
+        self.fresh_user().user_permissions.add(RestrictedModelPermission.get())
+        self.assertEqual(self.effective_perms(), {RestrictedModelPermission.__perm_str__})
+        RestrictedModelPermission.get().user_set.clear()
+        self.assertEqual(self.effective_perms(), set())
+
+        AuthorizedGlobalPermissionGroup.get().user_set.add(self.fresh_user())
+        self.assertEqual(self.effective_perms(), {GlobalPermission.__perm_str__})
+        self.fresh_user().groups.remove(AuthorizedGlobalPermissionGroup.get())
+        self.assertEqual(self.effective_perms(), set())
+
+    def test_maintained_by_group_permissions(self):
+        group = UnauthorizedGroup.get()
+        self.fresh_user().groups.add(group)
+        group.permissions.add(RestrictedModelPermission.get())
+        self.assertEqual(self.effective_perms(), {RestrictedModelPermission.__perm_str__})
+        RestrictedModelPermission.get().group_set.clear()
+        self.assertEqual(self.effective_perms(), set())
+
+        group.permissions.add(RestrictedModelPermission.get())
+        # the sync writes the through table in bulk, without m2m signals
+        setup_permissions(force=True)
+        self.assertEqual(self.effective_perms(), set())
+
+    def test_maintained_by_deletions(self):
+        self.fresh_user().groups.add(AuthorizedGroup.get())
+        self.fresh_user().user_permissions.add(GlobalPermission.get())
+        self.assertEqual(self.effective_perms(), {
+            RestrictedModelPermission.__perm_str__, GlobalPermission.__perm_str__
+        })
+        AuthorizedGroup.get().delete()
+        self.assertEqual(self.effective_perms(), {GlobalPermission.__perm_str__})
+        GlobalPermission.get().delete()
+        self.assertEqual(self.effective_perms(), set())
+
+
+class AsyncPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from guardian.models import UserObjectPermission
+        from .models import RestrictedModel
+
+        setup_permissions()
+        cls.user = get_user_model().objects.create(username='user')
+        cls.user.user_permissions.add(RestrictedModelPermission.get())
+        cls.instance = RestrictedModel.objects.create(owner=cls.user)
+        cls.other_instance = RestrictedModel.objects.create()
+        UserObjectPermission.objects.assign_perm(
+            ExplicitReferenceToRestrictedModelPermission.get(), cls.user, cls.instance
+        )
+
+    async def fresh_user(self):
+        return await get_user_model().objects.aget(pk=self.user.pk)
+
+    async def test_aget(self):
+        self.assertEqual(
+            await RestrictedModelPermission.aget(),
+            await Permission.objects.aget(codename=RestrictedModelPermission.codename)
+        )
+        self.assertEqual(
+            (await GlobalPermission.aget()).codename, GlobalPermission.codename
+        )
+        self.assertEqual((await AuthorizedGroup.aget()).name, AuthorizedGroup.group_name)
+
+    async def test_model_level_checks(self):
+        user = await self.fresh_user()
+        self.assertTrue(await RestrictedModelPermission.auser_has_perm(user))
+        self.assertFalse(await GlobalPermission.auser_has_perm(user))
+        self.assertTrue(await ahas_perm(user, 'test_app.restricted_model'))
+        self.assertTrue(await (RestrictedModelPermission & ~GlobalPermission).auser_has_perm(user))
+
+    async def test_object_level_checks(self):
+        user = await self.fresh_user()
+        self.assertTrue(await ExplicitReferenceToRestrictedModelPermission.auser_has_perm(
+            user, self.instance
+        ))
+        self.assertFalse(await ExplicitReferenceToRestrictedModelPermission.auser_has_perm(
+            user, self.other_instance
+        ))
+        self.assertTrue(await OwnRestrictedModelPermission.auser_has_perm(user, self.instance))
+        self.assertEqual(
+            await OwnRestrictedModelPermission.aallowed_objects(
+                user, [self.instance, self.other_instance]
+            ),
+            [self.instance]
+        )
+
+    async def test_concurrent_checks(self):
+        user = await self.fresh_user()
+        self.assertEqual(await asyncio.gather(
+            RestrictedModelPermission.auser_has_perm(user),
+            GlobalPermission.auser_has_perm(user),
+            ExplicitReferenceToRestrictedModelPermission.auser_has_perm(user, self.instance),
+            ahas_any(user, GlobalPermission, RestrictedModelPermission),
+        ), [True, False, True, True])
+
+    def test_one_worker_thread_per_check(self):
+        from unittest import mock
+        from asgiref.sync import async_to_sync, sync_to_async
+        from serious_django_permissions import permissions
+
+        hops = []
+
+        def counting_sync_to_async(func):
+            hops.append(func)
+            return sync_to_async(func)
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        # PermissionModelBackend is awaited, guardian's backend runs in a thread
+        with mock.patch.object(permissions, 'sync_to_async', counting_sync_to_async):
+            self.assertFalse(async_to_sync(ahas_perm)(user, GlobalPermission))
+            self.assertEqual(len(hops), 1)
+            self.assertFalse(async_to_sync(ahas_perm)(
+                user, ExplicitReferenceToRestrictedModelPermission, self.other_instance
+            ))
+            self.assertEqual(len(hops), 2)
+
+    def test_matches_sync_checks(self):
+        from asgiref.sync import async_to_sync
+
+        for perm in find_permissions():
+            user = get_user_model().objects.get(pk=self.user.pk)
+            self.assertEqual(
+                async_to_sync(ahas_perm)(user, perm), user.has_perm(perm), perm
+            )
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from guardian.models import UserObjectPermission
+        from .models import RestrictedModel
+
+        setup_permissions()
+        cls.user_pk = get_user_model().objects.create(username='user').pk
+        cls.instance = RestrictedModel.objects.create(owner_id=cls.user_pk)
+        UserObjectPermission.objects.assign_perm(
+            ExplicitReferenceToRestrictedModelPermission.get(),
+            get_user_model()(pk=cls.user_pk), cls.instance
+        )
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user_pk)
+
+    def test_model_level_checks(self):
+        from serious_django_permissions.instrumentation import track_permission_checks
+
+        user = self.fresh_user()
+        with track_permission_checks() as tracker:
+            user.has_perm(RestrictedModelPermission)
+            user.has_perm(GlobalPermission)
+
+        first, second = tracker.checks
+        self.assertEqual((first.perm, first.path, first.cache_hit), (RestrictedModelPermission, 'model', False))
+        self.assertGreater(first.queries, 0)
+        self.assertEqual((second.path, second.cache_hit, second.queries), ('model', True, 0))
+        self.assertFalse(second.granted)
+        self.assertEqual(tracker.count, 2)
+        self.assertEqual(tracker.queries, first.queries)
+
+    def test_object_level_checks(self):
+        from serious_django_permissions.instrumentation import track_permission_checks
+
+        user = self.fresh_user()
+        with track_permission_checks() as tracker:
+            user.has_perm(ExplicitReferenceToRestrictedModelPermission, self.instance)
+            user.has_perm(ExplicitReferenceToRestrictedModelPermission, self.instance)
+            user.has_perm(OwnRestrictedModelPermission, self.instance)
+
+        self.assertEqual(
+            [(check.path, check.cache_hit, check.granted) for check in tracker.checks],
+            [('guardian', False, True), ('guardian', True, True), ('programmatic', None, True)]
+        )
+        self.assertEqual(
+            list(tracker.by_permission()),
+            [ExplicitReferenceToRestrictedModelPermission.__perm_str__,
+             OwnRestrictedModelPermission.__perm_str__]
+        )
+
+    def test_cache_hit_unknown_without_guardian_cache(self):
+        from types import SimpleNamespace
+        from serious_django_permissions.permissions import _guardian_cache_hit
+
+        user = SimpleNamespace(_object_permission_checker=SimpleNamespace())
+        self.assertIsNone(_guardian_cache_hit(user, object()))
+        self.assertFalse(_guardian_cache_hit(SimpleNamespace(), object()))
+
+    def test_not_instrumented_without_receivers(self):
+        from serious_django_permissions.instrumentation import track_permission_checks
+        from serious_django_permissions.signals import permission_checked
+
+        with track_permission_checks():
+            self.assertTrue(permission_checked.has_listeners())
+        self.assertFalse(permission_checked.has_listeners())
+
+    def test_middleware_logs_permission_cost(self):
+        from serious_django_permissions.middleware import PermissionCostMiddleware
+
+        request = RequestFactory().get('/restricted-model-view/')
+        request.user = self.fresh_user()
+        with self.assertLogs('serious_django_permissions', 'DEBUG') as logs:
+            PermissionCostMiddleware(restricted_model_view)(request)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(logs.records[0].permission_checks, 1)
+        self.assertIn('1 permission checks', logs.output[0])
+        self.assertIn(RestrictedModelPermission.__perm_str__, logs.output[1])
+
+
+class PermissionQueryAssertionTests(PermissionQueriesTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import RestrictedModel
+
+        setup_permissions()
+        cls.user_pk = get_user_model().objects.create(username='user').pk
+        RestrictedModel.objects.bulk_create(RestrictedModel() for _ in range(3))
+
+    def setUp(self):
+        from .models import RestrictedModel
+
+        self.user = get_user_model().objects.get(pk=self.user_pk)
+        self.objects = list(RestrictedModel.objects.all())
+
+    def test_counts_only_permission_queries(self):
+        with self.assertMaxPermissionQueries(0) as tracker:
+            get_user_model().objects.count()
+        self.assertEqual(tracker.queries, 0)
+
+        with self.assertMaxPermissionQueries(2) as tracker:
+            self.user.has_perm(RestrictedModelPermission)
+            self.user.has_perm(GlobalPermission)
+        self.assertGreater(tracker.queries, 0)
+
+    def test_reports_the_permissions_causing_queries(self):
+        with self.assertRaises(AssertionError) as cm:
+            with self.assertMaxPermissionQueries(2):
+                for obj in self.objects:
+                    self.user.has_perm(ExplicitReferenceToRestrictedModelPermission, obj)
+        message = str(cm.exception)
+        self.assertIn('expected at most 2', message)
+        self.assertIn(
+            '{}: 6 queries in 3 checks'.format(
+                ExplicitReferenceToRestrictedModelPermission.__perm_str__
+            ),
+            message
+        )
+
+    def test_prefetched_object_checks(self):
+        from serious_django_permissions.permissions import prefetch_object_permissions
+
+        def check_all():
+            prefetch_object_permissions(self.user, self.objects)
+            for obj in self.objects:
+                self.user.has_perm(ExplicitReferenceToRestrictedModelPermission, obj)
+
+        self.assertMaxPermissionQueries(2, check_all)
+        with self.assertMaxPermissionQueries(2) as tracker:
+            ExplicitReferenceToRestrictedModelPermission.allowed_objects(
+                get_user_model().objects.get(pk=self.user_pk), self.objects
+            )
+        self.assertEqual(tracker.checks[0].path, 'bulk')
+
+    def test_counts_permission_lookups(self):
+        with self.assertMaxPermissionQueries(1) as tracker:
+            RestrictedModelPermission.get()
+        self.assertEqual(
+            [(check.perm, check.path) for check in tracker.checks],
+            [(RestrictedModelPermission, 'lookup')]
+        )
+
+    @skipIf(pytest is None, 'pytest is not installed')
+    def test_pytest_fixture(self):
+        from serious_django_permissions import testing
+
+        # the undecorated fixture function (pytest >= 8.4 wraps it)
+        fixture = getattr(
+            testing.assert_max_permission_queries, '__wrapped__',
+            testing.assert_max_permission_queries
+        )
+        assert_max_permission_queries = fixture()
+        with self.assertRaises(AssertionError):
+            with assert_max_permission_queries(0):
+                self.user.has_perm(RestrictedModelPermission)
+        # the user's permissions are cached now
+        with assert_max_permission_queries(0):
+            self.user.has_perm(RestrictedModelPermission)
+
+
+class PermissionBitmaskTests(TestCase):
+    def setUp(self):
+        setup_permissions()
+        self.user = get_user_model().objects.create(username='user')
+        self.user.user_permissions.add(RestrictedModelPermission.get())
+        self.user.groups.add(AuthorizedGlobalPermissionGroup.get())
+
+    def test_bits_are_assigned_in_sorted_order(self):
+        index = permission_index()
+        self.assertEqual(
+            sorted(index, key=index.get),
+            sorted(perm.__perm_str__ for perm in find_permissions())
+        )
+
+    def test_user_bitmask(self):
+        mask = PermissionBitmask.for_user(self.user)
+        self.assertTrue(mask.has(RestrictedModelPermission))
+        self.assertTrue(mask.has(GlobalPermission.__perm_str__))
+        self.assertFalse(mask.has(ExplicitReferenceToRestrictedModelPermission))
+        self.assertTrue(mask.has_all(RestrictedModelPermission, GlobalPermission))
+        self.assertFalse(mask.has_all(
+            RestrictedModelPermission, ExplicitReferenceToRestrictedModelPermission
+        ))
+        self.assertTrue(mask.has_any(
+            RestrictedModelPermission, ExplicitReferenceToRestrictedModelPermission
+        ))
+        self.assertFalse(mask.has_any(ExplicitReferenceToRestrictedModelPermission))
+        self.assertEqual(
+            mask.perm_strs(),
+            {RestrictedModelPermission.__perm_str__, GlobalPermission.__perm_str__}
+        )
+
+    def test_group_bitmask(self):
+        mask = PermissionBitmask.for_group(AuthorizedGlobalPermissionGroup)
+        self.assertEqual(mask, PermissionBitmask.from_perms([GlobalPermission]))
+        self.assertEqual(
+            PermissionBitmask.for_group(AuthorizedGroup.get())
+            | PermissionBitmask.for_group(AuthorizedGlobalPermissionGroup),
+            PermissionBitmask.from_perms([RestrictedModelPermission, GlobalPermission])
+        )
+
+    def test_unknown_permissions_are_never_contained(self):
+        mask = PermissionBitmask.from_perms(['auth.add_user', RestrictedModelPermission])
+        self.assertEqual(mask, PermissionBitmask.from_perms([RestrictedModelPermission]))
+        self.assertFalse(mask.has('auth.add_user'))
+        self.assertFalse(mask.has_all(RestrictedModelPermission, 'auth.add_user'))
+
+    def test_encode_decode(self):
+        mask = PermissionBitmask.for_user(self.user)
+        self.assertIsInstance(mask.encode(), bytes)
+        self.assertEqual(PermissionBitmask.decode(mask.encode()), mask)
+        self.assertEqual(PermissionBitmask(0).encode(), b'')
+
+
+class PermissionExpressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        setup_permissions()
+        cls.user_pk = get_user_model().objects.create(username='user').pk
+        user = get_user_model().objects.get(pk=cls.user_pk)
+        user.user_permissions.add(RestrictedModelPermission.get())
+        user.groups.add(AuthorizedGlobalPermissionGroup.get())
+        cls.factory = RequestFactory()
+
+    def setUp(self):
+        self.user = get_user_model().objects.get(pk=self.user_pk)
+
+    def test_string_representation(self):
+        self.assertEqual(
+            str((RestrictedModelPermission | GlobalPermission) & ~OwnRestrictedModelPermission),
+            '((RestrictedModelPermission | GlobalPermission) & ~OwnRestrictedModelPermission)'
+        )
+
+    def test_only_permissions_can_be_combined(self):
+        with self.assertRaises(TypeError):
+            RestrictedModelPermission & 'test_app.restricted_model'
+
+    def test_expressions_must_implement_evaluate(self):
+        from serious_django_permissions.permissions import PermissionExpression
+
+        with self.assertRaises(TypeError):
+            PermissionExpression()
+        with self.assertRaises(TypeError):
+            type('IncompleteExpression', (PermissionExpression,), {})()
+
+    def test_expressions_are_evaluated_against_one_permission_set(self):
+        with self.assertNumQueries(2):  # user and group permissions
+            self.assertTrue(self.user.has_perm(
+                RestrictedModelPermission & GlobalPermission
+            ))
+            self.assertTrue(self.user.has_perm(
+                (ExplicitReferenceToRestrictedModelPermission | GlobalPermission)
+                & ~ExplicitReferenceToRestrictedModelPermission
+            ))
+            self.assertFalse(self.user.has_perm(
+                RestrictedModelPermission & ~GlobalPermission
+            ))
+            self.assertTrue(has_all(self.user, RestrictedModelPermission, GlobalPermission))
+            self.assertFalse(has_all(
+                self.user, RestrictedModelPermission,
+                ExplicitReferenceToRestrictedModelPermission
+            ))
+            self.assertTrue(has_any(
+                self.user, RestrictedModelPermission,
+                ExplicitReferenceToRestrictedModelPermission
+            ))
+
+    def test_object_level_expression(self):
+        from guardian.models import UserObjectPermission
+        from .models import RestrictedModel
+
+        owned = RestrictedModel.objects.create(owner=self.user)
+        UserObjectPermission.objects.assign_perm(
+            RestrictedModelPermission.get(), self.user, owned
+        )
+        backend = PermissionModelBackend()
+        with self.assertNumQueries(2):  # user and group object permissions
+            self.assertTrue(backend.has_perm(
+                self.user,
+                OwnRestrictedModelPermission & RestrictedModelPermission
+                & ~ExplicitReferenceToRestrictedModelPermission,
+                owned
+            ))
+        self.assertFalse(backend.has_perm(
+            self.user,
+            OwnRestrictedModelPermission & RestrictedModelPermission,
+            RestrictedModel.objects.create()
+        ))
+
+    def test_permission_required(self):
+        request = self.factory.get('/restricted-combined-view')
+        request.user = self.user
+        self.assertEqual(restricted_combined_view(request).status_code, 200)
+
+        request.user = get_user_model().objects.create(username='other_user')
+        request.user.user_permissions.add(RestrictedModelPermission.get())
+        self.assertEqual(restricted_combined_view(request).status_code, 302)
+
+
+class RegistryTests(TestCase):
+    def test_permission_lookups(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        registry = BasePermission.registry
+        self.assertIs(
+            registry.by_perm_str('test_app.restricted_model'),
+            RestrictedModelPermission
+        )
+        self.assertIs(registry.get(GlobalPermission.__perm_str__), GlobalPermission)
+        self.assertIsNone(registry.get('test_app.undeclared'))
+        with self.assertRaises(LookupError):
+            registry.by_perm_str('test_app.undeclared')
+        self.assertIn(OwnRestrictedModelPermission, registry.by_app_label('test_app'))
+        self.assertEqual(registry.by_codename('restricted_model'), [RestrictedModelPermission])
+        self.assertIn(RestrictedModelPermission, registry)
+        self.assertNotIn('auth.add_user', registry)
+
+    def test_group_lookups(self):
+        from serious_django_permissions.groups import Group as BaseGroup
+
+        self.assertIs(BaseGroup.registry.by_name('authorized'), AuthorizedGroup)
+        self.assertEqual(
+            BaseGroup.registry.by_module('test_app.groups'),
+            [AuthorizedGroup, UnauthorizedGroup, AuthorizedGlobalPermissionGroup]
+        )
+        self.assertEqual(find_groups(), BaseGroup.registry.by_module('test_app.groups'))
+
+    def test_subclass_of_a_permission(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        for lazy in (False, True):
+            with self.settings(SERIOUS_PERMISSIONS_LAZY=lazy):
+                perm = type('SubclassedRestrictedModelPermission', (RestrictedModelPermission,), {
+                    '__module__': 'test_app.tests',
+                    'description': 'Subclasses RestrictedModelPermission',
+                })
+            self.addCleanup(BasePermission.registry.unregister, perm)
+            self.assertEqual(perm.__perm_str__, 'test_app.subclassed_restricted_model')
+            self.assertIs(BasePermission.registry.get(perm.__perm_str__), perm)
+            self.assertIs(
+                BasePermission.registry.get(RestrictedModelPermission.__perm_str__),
+                RestrictedModelPermission
+            )
+            BasePermission.registry.unregister(perm)
+
+    def test_duplicate_permission(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        with self.assertRaises(ImproperlyConfigured) as e:
+            type('DuplicateRestrictedModelPermission', (BasePermission,), {
+                '__module__': 'test_app.tests',
+                'model': 'RestrictedModel',
+                'codename': 'restricted_model',
+                'description': 'Declares test_app.restricted_model again',
+            })
+        self.assertIn("declare the same permission 'test_app.restricted_model'",
+            str(e.exception)
+        )
+
+    def test_string_permissions_use_programmatic_object_checks(self):
+        from .models import RestrictedModel
+
+        user = get_user_model().objects.create(username='user')
+        self.assertTrue(PermissionModelBackend().has_perm(
+            user, OwnRestrictedModelPermission.__perm_str__,
+            RestrictedModel(owner=user)
+        ))
+
+
+class AppLabelResolutionTests(TestCase):
+    def test_app_label_is_resolved_from_app_registry_and_memoized(self):
+        from serious_django_permissions import permissions
+
+        permissions._app_labels.pop('test_app.some_module', None)
+        self.assertEqual(
+            permissions._resolve_app_label('test_app.some_module'), 'test_app'
+        )
+        self.assertEqual(permissions._app_labels['test_app.some_module'], 'test_app')
+        self.assertEqual(RestrictedModelPermission.app_label, 'test_app')
+
+    def test_nested_apps_use_their_label(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from serious_django_permissions import permissions
+
+        permissions._app_labels.pop('project.blog.permissions', None)
+        self.addCleanup(permissions._app_labels.pop, 'project.blog.permissions', None)
+        app_config = SimpleNamespace(name='project.blog', label='blog')
+        with mock.patch.object(
+            permissions.apps, 'get_containing_app_config', return_value=app_config
+        ):
+            self.assertEqual(
+                permissions._resolve_app_label('project.blog.permissions'), 'blog'
+            )
+
+
+@override_settings(SERIOUS_PERMISSIONS_LAZY=True)
+class LazyModeTests(TestCase):
+    def declare(self, name, **attrs):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        attrs.setdefault('__module__', 'test_app.tests')
+        cls = type(name, (BasePermission,), attrs)
+        self.addCleanup(BasePermission.registry.unregister, cls)
+        return cls
+
+    def test_attributes_are_resolved_on_first_access(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        perm = self.declare(
+            'LazyRestrictedModelPermission',
+            model='RestrictedModel', description='Declared in lazy mode',
+        )
+        self.assertNotIn('codename', perm.__dict__)
+        self.assertTrue(BasePermission.registry.is_deferred(perm))
+
+        self.assertEqual(perm.__perm_str__, 'test_app.lazy_restricted_model')
+        self.assertEqual(perm.codename, 'lazy_restricted_model')
+        self.assertIs(BasePermission.registry.get(perm.__perm_str__), perm)
+
+    def test_registry_lookups_resolve_deferred_classes(self):
+        from serious_django_permissions.permissions import Permission as BasePermission
+
+        perm = self.declare(
+            'LazyGlobalPermission', model=None, description='Declared in lazy mode',
+        )
+        self.assertIs(
+            BasePermission.registry.by_perm_str(
+                'serious_django_permissions.test_app.lazy_global'
+            ),
+            perm
+        )
+
+    def test_errors_are_reported_by_system_check(self):
+        from serious_django_permissions.checks import check_permissions
+
+        perm = self.declare('LazyInvalidName', model='RestrictedModel', description='x')
+        errors = check_permissions(None)
+        self.assertEqual([e.id for e in errors], ['serious_django_permissions.E001'])
+        self.assertIn("must end with 'Permission'.", errors[0].msg)
+
+        with self.assertRaises(ImproperlyConfigured):
+            perm.codename
+
+
+class SyncFingerprintTests(TestCase):
+    def test_unchanged_declarations_are_not_synced_again(self):
+        create_groups.Command().handle()
+        Group.objects.filter(name=AuthorizedGroup.group_name).delete()
+
+        with self.assertNumQueries(1):
+            create_groups.Command().handle()
+        self.assertFalse(Group.objects.filter(name=AuthorizedGroup.group_name).exists())
+
+        with self.assertNumQueries(1):
+            create_permissions.Command().handle()
+
+    def test_force(self):
+        create_groups.Command().handle()
+        Group.objects.filter(name=AuthorizedGroup.group_name).delete()
+
+        create_groups.Command().handle(force=True)
+        self.assertTrue(Group.objects.filter(name=AuthorizedGroup.group_name).exists())
+
+    def test_changed_declarations_are_synced(self):
+        create_groups.Command().handle()
+        SyncFingerprint.objects.update(fingerprint='outdated')
+        Group.objects.filter(name=AuthorizedGroup.group_name).delete()
+
+        create_groups.Command().handle()
+        self.assertTrue(Group.objects.filter(name=AuthorizedGroup.group_name).exists())
+
+    def test_fingerprint_covers_descriptions(self):
+        from serious_django_permissions.sync import permissions_fingerprint
+
+        fingerprint = permissions_fingerprint(find_permissions())
+        description = GlobalPermission.description
+        GlobalPermission.description = 'A changed description'
+        try:
+            self.assertNotEqual(permissions_fingerprint(find_permissions()), fingerprint)
+        finally:
+            GlobalPermission.description = description
+
+
+class SyncPlanTests(TestCase):
+    def call(self, command, *args):
+        out = StringIO()
+        call_command(command, *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            output = self.call('create_groups', '--dry-run')
+        self.assertFalse(any(
+            q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) for q in queries
+        ))
+        self.assertFalse(Permission.objects.filter(
+            codename=RestrictedModelPermission.codename
+        ).exists())
+        self.assertFalse(Group.objects.exists())
+        self.assertIn('+ group {}'.format(AuthorizedGroup.group_name), output)
+        self.assertIn('+ membership {}: test_app.{}'.format(
+            AuthorizedGroup.group_name, RestrictedModelPermission.codename
+        ), output)
+
+    def test_plan_query_count_does_not_depend_on_number_of_groups(self):
+        from serious_django_permissions.sync import plan_groups
+
+        setup_permissions()
+        permissions = find_permissions()
+        plan_groups([AuthorizedGroup], permissions=permissions)
+        with CaptureQueriesContext(connection) as single:
+            plan_groups([AuthorizedGroup], permissions=permissions)
+        with CaptureQueriesContext(connection) as many:
+            plan_groups(find_groups(), permissions=permissions)
+        self.assertEqual(len(single), len(many))
+
+    def test_diff_lists_changes(self):
+        setup_permissions()
+        UnauthorizedGroup.get().permissions.add(GlobalPermission.get())
+        Permission.objects.filter(
+            codename=GlobalPermission.codename
+        ).update(name='outdated description')
+
+        self.assertEqual(self.call('create_groups', '--dry-run').splitlines(), [
+            '~ permission serious_django_permissions.{} "outdated description" -> "{}"'.format(
+                GlobalPermission.codename, GlobalPermission.description
+            ),
+            '- membership {}: serious_django_permissions.{}'.format(
+                UnauthorizedGroup.group_name, GlobalPermission.codename
+            ),
+        ])
+        self.assertTrue(UnauthorizedGroup.get().permissions.exists())
+
+        self.call('create_groups', '--force', '--diff')
+        self.assertFalse(UnauthorizedGroup.get().permissions.exists())
+        self.assertEqual(self.call('create_groups', '--dry-run'), 'No changes.\n')
+
+    def test_json(self):
+        data = json.loads(self.call('create_permissions', '--dry-run', '--json'))
+        self.assertTrue(data['dry_run'])
+        self.assertIn(
+            {'permission': 'test_app.{}'.format(RestrictedModelPermission.codename),
+             'name': RestrictedModelPermission.description},
+            data['permissions']['added']
+        )
+        self.assertEqual(data['permissions']['changed'], [])
+
+
+class PruneTests(TestCase):
+    def setUp(self):
+        from django.contrib.contenttypes.models import ContentType
+        from serious_django_permissions.models import GlobalPermission as GlobalPermissionModel
+        from .models import RestrictedModel
+
+        setup_permissions()
+        self.stale_global = GlobalPermissionModel.objects.create(
+            codename='test_app.removed', name='A removed global permission'
+        )
+        self.stale = Permission.objects.create(
+            codename='removed_restricted_model',
+            name='A removed permission',
+            content_type=ContentType.objects.get_for_model(RestrictedModel),
+        )
+        # as if it had been synced from a Permission class that was removed;
+        # global permissions are stale without being recorded, e.g. if they
+        # were synced before permissions were recorded
+        SyncedPermission.objects.create(permission=self.stale)
+        # created by another app, on a model with declared permissions
+        self.foreign = Permission.objects.create(
+            codename='publish_restricted_model',
+            name='Created by another app',
+            content_type=ContentType.objects.get_for_model(RestrictedModel),
+        )
+        self.group = AuthorizedGroup.get()
+        self.group.permissions.add(self.stale_global, self.stale)
+        self.user = get_user_model().objects.create(username='user')
+        self.user.user_permissions.add(self.stale)
+
+    def test_prune_deletes_stale_permissions_and_references(self):
+        from guardian.models import UserObjectPermission
+        from .models import RestrictedModel
+
+        for instance in [RestrictedModel.objects.create() for _ in range(3)]:
+            UserObjectPermission.objects.assign_perm(self.stale, self.user, instance)
+
+        with self.settings(SERIOUS_PERMISSIONS_PRUNE_BATCH_SIZE=2):
+            call_command('create_permissions', '--prune', stdout=StringIO())
+
+        self.assertFalse(Permission.objects.filter(
+            pk__in=[self.stale.pk, self.stale_global.pk]
+        ).exists())
+        self.assertFalse(UserObjectPermission.objects.exists())
+        self.assertFalse(self.user.user_permissions.exists())
+        self.assertEqual(
+            list(self.group.permissions.all()), [RestrictedModelPermission.get()]
+        )
+
+    def test_prune_keeps_declared_and_builtin_permissions(self):
+        kept = set(Permission.objects.exclude(
+            pk__in=[self.stale.pk, self.stale_global.pk]
+        ))
+        call_command('create_permissions', '--prune', stdout=StringIO())
+        self.assertEqual(set(Permission.objects.all()), kept)
+        self.assertTrue(Permission.objects.filter(codename='change_restrictedmodel').exists())
+        self.assertIn(self.foreign, kept)
+
+    def test_synced_permissions_are_recorded(self):
+        self.assertTrue(SyncedPermission.objects.filter(
+            permission=RestrictedModelPermission.get()
+        ).exists())
+        self.assertFalse(SyncedPermission.objects.filter(permission=self.foreign).exists())
+
+        # permissions synced before they were recorded are recorded by the next sync
+        SyncedPermission.objects.filter(permission=GlobalPermission.get()).delete()
+        call_command('create_permissions', '--force', stdout=StringIO())
+        self.assertTrue(SyncedPermission.objects.filter(
+            permission=GlobalPermission.get()
+        ).exists())
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('create_permissions', '--prune', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            '- permission serious_django_permissions.test_app.removed "A removed global permission"',
+            '- permission test_app.removed_restricted_model "A removed permission"',
+        ])
+        self.assertTrue(Permission.objects.filter(pk=self.stale.pk).exists())
+
+
+class SyncOnMigrateTests(TestCase):
+    def send(self, app_config):
+        from serious_django_permissions.signals import sync_on_migrate
+
+        sync_on_migrate(sender=app_config, app_config=app_config, verbosity=0)
+
+    def last_app_config(self):
+        from django.apps import apps
+
+        return [
+            config for config in apps.get_app_configs()
+            if config.models_module is not None
+        ][-1]
+
+    @override_settings(SERIOUS_PERMISSIONS_SYNC_ON_MIGRATE=True)
+    def test_syncs_once_per_migrate(self):
+        from django.apps import apps
+
+        with self.assertNumQueries(0):
+            self.send(apps.get_app_config('auth'))
+        self.send(self.last_app_config())
+        self.assertTrue(Group.objects.filter(name=AuthorizedGroup.group_name).exists())
+
+        with self.assertNumQueries(1):
+            self.send(self.last_app_config())
+
+    def test_disabled_by_default(self):
+        with self.assertNumQueries(0):
+            self.send(self.last_app_config())
+        self.assertFalse(Group.objects.exists())
+
+    @override_settings(SERIOUS_PERMISSIONS_SYNC_ON_MIGRATE=True)
+    def test_writes_to_the_stdout_of_migrate(self):
+        from serious_django_permissions.signals import sync_on_migrate
+
+        out = StringIO()
+        app_config = self.last_app_config()
+        sync_on_migrate(sender=app_config, app_config=app_config, verbosity=2, stdout=out)
+        self.assertEqual(out.getvalue(), "Synced the declared permissions and groups.\n")
@@ -15,3 +15,7 @@ def restricted_model_with_explicit_reference_view(request):
 @permission_required(GlobalPermission)
 def restricted_global_view(request):
     return HttpResponse("You've accessed restricted_global_view")
+
+@permission_required(RestrictedModelPermission & GlobalPermission)
+def restricted_combined_view(request):
+    return HttpResponse("You've accessed restricted_combined_view")